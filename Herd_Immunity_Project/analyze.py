@@ -0,0 +1,314 @@
+import argparse, json, os
+from multiprocessing import Pool
+
+STEP_COUNTS = ("interactions", "infections", "not_infected", "saved", "already_infected",
+               "deaths", "survivals")
+CHUNK_SIZE = 1 << 20
+# Labels of the master_stats numbers summarize falls back on, see parse_master_stats.
+STATS_DEAD = "Killed by Contagion"
+STATS_SAVED = "of INSTANCES Someone was Saved by being Vaccinated"
+STATS_INFECTED = "Total # Infected by Virus Overall"
+
+
+def read_lines(file_name, start=0, end=None, chunk_size=CHUNK_SIZE):
+    """Yields the lines of file_name between the byte offsets start and end,
+    reading chunk_size bytes at a time.  Only one chunk is held in memory."""
+    with open(file_name, "rb") as f:
+        f.seek(start)
+        remaining = None if end is None else end - start
+        leftover = b""
+        while remaining is None or remaining > 0:
+            size = chunk_size if remaining is None else min(chunk_size, remaining)
+            chunk = f.read(size)
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            lines = (leftover + chunk).split(b"\n")
+            leftover = lines.pop()
+            for line in lines:
+                yield line
+        if leftover:
+            yield leftover
+
+
+def classify(lines):
+    """Turns log lines into (kind, line) events, where kind is one of STEP_COUNTS
+    without "interactions", or "time_step", "master_stats", "strain_stats" or
+    "metadata"."""
+    for line in lines:
+        if line.endswith(b"vaccinated."):
+            yield "saved", line
+        elif line.endswith(b"already infected."):
+            yield "already_infected", line
+        elif b" does not infect " in line:
+            yield "not_infected", line
+        elif b" infects " in line:
+            yield "infections", line
+        elif line.endswith(b"has died."):
+            yield "deaths", line
+        elif line.endswith(b"now vaccinated!"):
+            yield "survivals", line
+        elif line.startswith(b"Time step "):
+            yield "time_step", line
+        elif line.startswith(b"# Killed"):
+            yield "master_stats", line
+        elif line.startswith(b"# Strain "):
+            yield "strain_stats", line
+        elif line:
+            yield "metadata", line
+
+
+def new_step():
+    return dict((name, 0) for name in STEP_COUNTS)
+
+
+def parse_master_stats(line):
+    """Returns the numbers of a master_stats line, by their label."""
+    stats = {}
+    for part in line.decode("utf-8").split(", "):
+        label, _, value = part.rpartition(": ")
+        stats[label.lstrip("# ")] = int(value)
+    return stats
+
+
+def count_steps(events, first_step=0):
+    """Adds the events up per time step.  Interactions belong to the time step
+    they are logged in; deaths and survivals are logged after the
+    "Time step n ending" line, but belong to time step n.  Returns
+    (steps, metadata, last master_stats, opening master_stats, time steps) with
+    steps as {step number: counts}.  The opening master_stats is the one logged
+    before the first time step line of the run, if there is one, and time steps is
+    the number of time step lines up to the last one seen."""
+    steps = {}
+    step = first_step
+    metadata = None
+    stats = None
+    opening = None
+    time_steps = 0
+    for kind, line in events:
+        if kind == "time_step":
+            step = int(line.split()[2]) + 1
+            time_steps = step
+            if first_step == 0 and opening is None:
+                opening = stats or {}
+        elif kind == "deaths" or kind == "survivals":
+            steps.setdefault(step - 1, new_step())[kind] += 1
+        elif kind == "master_stats":
+            stats = parse_master_stats(line)
+        elif kind == "metadata":
+            metadata = line.decode("utf-8").split()
+        elif kind == "strain_stats":
+            continue
+        else:
+            counts = steps.setdefault(step, new_step())
+            counts[kind] += 1
+            counts["interactions"] += 1
+    return steps, metadata, stats, opening or None, time_steps
+
+
+def count_range(job):
+    file_name, start, end, first_step = job
+    return count_steps(classify(read_lines(file_name, start, end)), first_step)
+
+
+def split_points(file_name, parts):
+    """Finds up to parts ranges of the log that each start right after a
+    "Time step n ending" line, without reading the whole file.  Returns a list of
+    (start, end, first time step) tuples."""
+    size = os.path.getsize(file_name)
+    points = [(0, 0)]
+    with open(file_name, "rb") as f:
+        for part in range(1, parts):
+            f.seek(max(size * part // parts, points[-1][0]))
+            f.readline()
+            line = f.readline()
+            while line and not line.startswith(b"Time step "):
+                line = f.readline()
+            if not line:
+                break
+            offset = f.tell()
+            if offset > points[-1][0]:
+                points.append((offset, int(line.split()[2]) + 1))
+    ends = [offset for offset, _ in points[1:]] + [size]
+    return [(start, end, step) for (start, step), end in zip(points, ends)]
+
+
+def analyze(file_name, processes=1):
+    """Reads a text log once and returns its summary and per time step counts.
+    With more than one process, the log is split at time step boundaries and
+    the pieces are counted in parallel."""
+    if processes > 1:
+        jobs = [(file_name, start, end, step) for start, end, step in split_points(file_name, processes)]
+        pool = Pool(processes)
+        try:
+            parts = pool.map(count_range, jobs)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        parts = [count_range((file_name, 0, None, 0))]
+    steps = {}
+    metadata = None
+    stats = None
+    opening = None
+    time_steps = 0
+    for part_steps, part_metadata, part_stats, part_opening, part_time_steps in parts:
+        for step, counts in part_steps.items():
+            total = steps.setdefault(step, new_step())
+            for name in STEP_COUNTS:
+                total[name] += counts[name]
+        metadata = metadata or part_metadata
+        stats = part_stats or stats
+        opening = opening or part_opening
+        time_steps = max(time_steps, part_time_steps)
+    return summarize(steps, metadata, stats, opening, time_steps)
+
+
+def number(text):
+    """Reads a number from the metadata line.  A multi-strain simulation logs one
+    number per strain joined by "/", which is kept as text."""
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+def summarize(steps, metadata, stats, opening=None, time_steps=0):
+    """Answers the README questions from per time step counts.  A log written
+    below the "interactions" verbosity has no interaction records, so then the
+    answers come from its final master_stats line instead, and the number of
+    interactions is None.  Raises ValueError if the log has neither.  Below the
+    "resolutions" verbosity, the initially infected are read from the opening
+    master_stats, and the number of time steps from the time step lines.  A log
+    with neither leaves them None."""
+    ordered = [dict(step=step, **steps[step]) for step in sorted(steps)]
+    totals = new_step()
+    for counts in ordered:
+        for name in STEP_COUNTS:
+            totals[name] += counts[name]
+    population_size = int(metadata[0]) if metadata else None
+    initial_infected = None
+    if ordered:
+        initial_infected = ordered[0]["deaths"] + ordered[0]["survivals"]
+    elif opening is not None:
+        initial_infected = opening[STATS_INFECTED]
+    if totals["interactions"]:
+        ever_infected = initial_infected + totals["infections"]
+        dead = totals["deaths"]
+        saved = totals["saved"]
+        interactions = totals["interactions"]
+    elif stats is not None:
+        ever_infected = stats[STATS_INFECTED]
+        dead = stats[STATS_DEAD]
+        saved = stats[STATS_SAVED]
+        interactions = None
+    else:
+        raise ValueError("the log has no interactions and no master_stats line, "
+                         "it was written with too low a verbosity to analyze")
+    summary = {"inputs": {"population_size": population_size,
+                          "vacc_percentage": number(metadata[1]) if metadata else None,
+                          "virus_name": metadata[2] if metadata else None,
+                          "mortality_rate": number(metadata[3]) if metadata else None,
+                          "basic_repro_num": number(metadata[4]) if metadata else None,
+                          "initial_infected": initial_infected},
+               "time_steps": max(len(ordered), time_steps) or None,
+               "ever_infected": ever_infected,
+               "dead": dead,
+               "saved_by_vaccination": saved,
+               "interactions": interactions,
+               "final_master_stats": stats,
+               "steps": ordered}
+    if population_size:
+        summary["infected_percent"] = 100.0 * ever_infected / population_size
+        summary["dead_percent"] = 100.0 * dead / population_size
+    return summary
+
+
+def binary_master_stats(records, end):
+    """parse_master_stats for the master_stats records of a binary log that end
+    at index end, with records as EventLogReader.array returns them."""
+    import numpy as np
+    from logger import STATS_DEAD_SURVIVED, master_stats_line, master_stats_values
+    # The records of one master_stats call start with STATS_DEAD_SURVIVED.
+    start = max(0, end - 5)
+    start += int(np.flatnonzero(records["code"][start:end] == STATS_DEAD_SURVIVED)[-1])
+    group = records[start:end]
+    values = master_stats_values(dict((int(code), (int(a), int(b))) for a, b, code in
+                                      zip(group["a"].tolist(), group["b"].tolist(), group["code"].tolist())))
+    dead, survived, vaccinated, saved, infected, newly, living, _ = values
+    return parse_master_stats(master_stats_line(dead, survived, vaccinated, saved, infected,
+                                                newly, living).strip().encode("utf-8"))
+
+
+def analyze_binary(file_name):
+    """Same as analyze, for a log written by BinaryLogger.  Counts every record
+    type per time step with NumPy instead of reading records one at a time."""
+    import numpy as np
+    from logger import EventLogReader, INFECTS, DOES_NOT_INFECT, VACCINATED, ALREADY_INFECTED, DIED, SURVIVED
+    from logger import TIME_STEP, STATS_LIVING
+    with EventLogReader(file_name) as reader:
+        records = reader.array()
+        counts = np.zeros((int(records["step"].max()) + 1 if len(records) else 1, 256), dtype=np.int64)
+        np.add.at(counts, (records["step"], records["code"]), 1)
+        metadata = reader.metadata.split()
+        # The master_stats of the whole population, not of a single strain.
+        overall = np.flatnonzero((records["code"] == STATS_LIVING) & (records["b"] == 0))
+        stats = binary_master_stats(records, int(overall[-1]) + 1) if len(overall) else None
+        opening = None
+        first_step = np.flatnonzero(records["code"] == TIME_STEP)[:1]
+        if len(overall) and len(first_step) and overall[0] < first_step[0]:
+            opening = binary_master_stats(records, int(overall[0]) + 1)
+        time_steps = int(counts[:, TIME_STEP].sum())
+        del records
+    steps = {}
+    for step in range(len(counts)):
+        interactions = counts[step, [INFECTS, DOES_NOT_INFECT, VACCINATED, ALREADY_INFECTED]]
+        # BinaryLogger stamps deaths and survivals with the step after the one they end.
+        resolved = counts[step + 1] if step + 1 < len(counts) else np.zeros(256, dtype=np.int64)
+        if interactions.sum() == 0 and resolved[DIED] + resolved[SURVIVED] == 0:
+            continue
+        steps[step] = {"interactions": int(interactions.sum()),
+                       "infections": int(interactions[0]),
+                       "not_infected": int(interactions[1]),
+                       "saved": int(interactions[2]),
+                       "already_infected": int(interactions[3]),
+                       "deaths": int(resolved[DIED]),
+                       "survivals": int(resolved[SURVIVED])}
+    return summarize(steps, metadata, stats, opening, time_steps)
+
+
+def report(summary):
+    inputs = summary["inputs"]
+    print("1. The inputs were: {population_size} {vacc_percentage} {virus_name} {mortality_rate} "
+          "{basic_repro_num} {initial_infected}".format(**inputs))
+    print("2. {} out of {} people, or {:.2f}%, became infected at some point.".format(
+        summary["ever_infected"], inputs["population_size"], summary.get("infected_percent", 0)))
+    print("3. {} out of {} people, or {:.2f}%, died.".format(
+        summary["dead"], inputs["population_size"], summary.get("dead_percent", 0)))
+    if summary["interactions"] is None:
+        print("4. Vaccination saved someone from infection {} times.".format(summary["saved_by_vaccination"]))
+    else:
+        print("4. Out of {} interactions, vaccination saved someone from infection {} times.".format(
+            summary["interactions"], summary["saved_by_vaccination"]))
+    print("step\tinteractions\tinfections\tsaved\tdeaths\tsurvivals")
+    for step in summary["steps"]:
+        print("{step}\t{interactions}\t{infections}\t{saved}\t{deaths}\t{survivals}".format(**step))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answers the README questions from a simulation log.")
+    parser.add_argument("log_file")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="split the log at time step boundaries and count the pieces in parallel")
+    parser.add_argument("--binary", action="store_true", help="the log was written by BinaryLogger")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args()
+    if args.binary:
+        summary = analyze_binary(args.log_file)
+    else:
+        summary = analyze(args.log_file, args.processes)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        report(summary)
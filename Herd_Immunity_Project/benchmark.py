@@ -0,0 +1,182 @@
+import argparse, json, os, platform, shutil, subprocess, tempfile, time
+from multiprocessing import Pool
+from logger import Logger, BinaryLogger, NullLogger, LOG_SUMMARY
+from person import Person
+from metrics import peak_memory_mb
+import simulation
+
+CASES = ("create_population", "time_step", "time_step_counts", "interaction", "did_survive_infection", "logger", "network")
+LOGGERS = ("text", "buffered", "binary")
+NETWORKS = ("regular", "small-world", "scale-free")
+
+
+def make_logger(kind, file_name):
+    if kind == "binary":
+        return BinaryLogger(file_name, 10000)
+    if kind == "buffered":
+        return Logger(file_name, 10000)
+    return Logger(file_name)
+
+
+def make_simulation(engine, size, vacc_percentage, infected, log_file):
+    return simulation.Simulation(size, vacc_percentage, "Benchmark", 0.5, 0.1, infected,
+                                 engine=engine, logger=Logger(log_file, 10000), seed=42)
+
+
+def bench_create_population(engine, size, vacc_percentage, infected, log_file):
+    start = time.perf_counter()
+    make_simulation(engine, size, vacc_percentage, infected, log_file)
+    return time.perf_counter() - start, 0
+
+
+def bench_time_step(engine, size, vacc_percentage, infected, log_file):
+    sim = make_simulation(engine, size, vacc_percentage, infected, log_file)
+    start = time.perf_counter()
+    sim.time_step()
+    sim.logger.close()
+    return time.perf_counter() - start, len(sim.infected_people) * min(100, size)
+
+
+def bench_time_step_counts(engine, size, vacc_percentage, infected, log_file):
+    """Same as bench_time_step with the aggregated fast path, which only runs
+    when interactions are not logged."""
+    sim = simulation.Simulation(size, vacc_percentage, "Benchmark", 0.5, 0.1, infected, engine=engine,
+                                logger=NullLogger(None, verbosity=LOG_SUMMARY), seed=42, aggregate=True)
+    start = time.perf_counter()
+    sim.time_step()
+    return time.perf_counter() - start, len(sim.infected_people) * min(100, size)
+
+
+def bench_interaction(engine, size, vacc_percentage, infected, log_file):
+    sim = make_simulation("list", size, vacc_percentage, infected, log_file)
+    pairs = [(sim.population[0], person) for person in sim.sampler.sample(min(size, 100000))]
+    start = time.perf_counter()
+    for person, target in pairs:
+        sim.interaction(person, target)
+    return time.perf_counter() - start, len(pairs)
+
+
+def bench_did_survive_infection(engine, size, vacc_percentage, infected, log_file):
+    people = [Person(_id, False, 0.5) for _id in range(min(size, 100000))]
+    start = time.perf_counter()
+    for person in people:
+        person.did_survive_infection()
+    return time.perf_counter() - start, 0
+
+
+def bench_logger(engine, size, vacc_percentage, infected, log_file):
+    """Logs min(size, 100000) interactions.  The engine argument is reused to
+    pick the kind of logger, one of LOGGERS."""
+    logger = make_logger(engine, log_file)
+    people = [Person(_id, _id % 2 == 0, None) for _id in range(min(size, 100000))]
+    start = time.perf_counter()
+    logger.write_metadata(size, vacc_percentage, "Benchmark", 0.5, 0.1)
+    for person in people:
+        logger.log_interaction(people[0], person, False, person.is_vaccinated, None)
+    logger.log_time_step(0)
+    logger.close()
+    return time.perf_counter() - start, len(people)
+
+
+def bench_network(engine, size, vacc_percentage, infected, log_file):
+    """Generates a contact network with 10 * size edges.  The engine argument is
+    reused to pick the generator, one of NETWORKS, and edges are counted as
+    interactions."""
+    import numpy as np
+    import network
+    start = time.perf_counter()
+    contacts = network.generate(engine, size, 20, np.random.default_rng(42))
+    return time.perf_counter() - start, contacts.edges
+
+
+def run_case(job):
+    """Runs one benchmark in a fresh worker process, so the peak memory reported
+    belongs to this case only."""
+    case, engine, size, vacc_percentage, infected = job
+    log_dir = tempfile.mkdtemp()
+    log_file = os.path.join(log_dir, "log")
+    try:
+        seconds, interactions = globals()["bench_" + case](engine, size, vacc_percentage,
+                                                           infected, log_file)
+        log_bytes = os.path.getsize(log_file) if os.path.exists(log_file) else 0
+    finally:
+        shutil.rmtree(log_dir)
+    return {"case": case,
+            "engine": engine,
+            "population_size": size,
+            "vacc_percentage": vacc_percentage,
+            "initial_infected": infected,
+            "seconds": seconds,
+            "interactions_per_second": interactions / seconds if interactions and seconds else None,
+            "peak_memory_mb": peak_memory_mb(),
+            "log_bytes": log_bytes}
+
+
+def revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark(cases, engines, sizes, vacc_percentages, infected):
+    jobs = []
+    for case in cases:
+        kinds = LOGGERS if case == "logger" else engines
+        if case == "network":
+            kinds = NETWORKS
+        if case in ("interaction", "did_survive_infection"):
+            kinds = ["list"]
+        for kind in kinds:
+            for size in sizes:
+                for vacc_percentage in vacc_percentages:
+                    jobs.append((case, kind, size, vacc_percentage, infected))
+    results = []
+    for job in jobs:
+        pool = Pool(1)
+        try:
+            result = pool.apply(run_case, (job,))
+        finally:
+            pool.close()
+            pool.join()
+        print("{case:<22}{engine:<9}{population_size:>9}{vacc_percentage:>6}"
+              "{seconds:>10.4f}s{:>9}MB{log_bytes:>12}B  ".format(
+                  "?" if result["peak_memory_mb"] is None else "{:.1f}".format(result["peak_memory_mb"]), **result)
+              + ("{:.0f} interactions/s".format(result["interactions_per_second"])
+                 if result["interactions_per_second"] else ""))
+        results.append(result)
+    return {"revision": revision(), "python": platform.python_version(), "results": results}
+
+
+def compare(old, new):
+    """Prints how much faster (>1) or slower (<1) every case of new is than old."""
+    old_seconds = dict(((r["case"], r["engine"], r["population_size"], r["vacc_percentage"]), r["seconds"])
+                       for r in old["results"])
+    print("compared to revision {}:".format(old.get("revision")))
+    for r in new["results"]:
+        key = (r["case"], r["engine"], r["population_size"], r["vacc_percentage"])
+        if key in old_seconds:
+            print("{:<22}{:<9}{:>9}{:>6}{:>8.2f}x".format(r["case"], r["engine"], r["population_size"],
+                                                         r["vacc_percentage"], old_seconds[key] / r["seconds"]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks the hot paths of the simulation.")
+    parser.add_argument("--cases", nargs="+", choices=CASES, default=list(CASES))
+    parser.add_argument("--engines", nargs="+", choices=["list", "array"], default=["list", "array"])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--vacc", type=float, nargs="+", default=[0.1, 0.5, 0.9])
+    parser.add_argument("--infected", type=int, default=100,
+                        help="people infected when a time step is timed")
+    parser.add_argument("--out", default="benchmark_results.json")
+    parser.add_argument("--compare", default=None, metavar="OLD_RESULTS",
+                        help="results file of an earlier revision to compare against")
+    args = parser.parse_args()
+    report = benchmark(args.cases, args.engines, args.sizes, args.vacc, args.infected)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
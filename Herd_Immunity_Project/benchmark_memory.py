@@ -0,0 +1,56 @@
+import argparse, gc, importlib.util, random, tracemalloc
+from person import Person
+# Imported here, not while tracemalloc is running, so only the population itself is measured.
+HAS_NUMPY = importlib.util.find_spec("numpy") is not None
+if HAS_NUMPY:
+    import numpy as np
+    from population import Population
+
+
+class DictPerson(object):
+    '''The Person class as it was before __slots__, kept here for comparison.'''
+
+    def __init__(self, _id, is_vaccinated, infected=None):
+        self._id = _id
+        self.is_vaccinated = is_vaccinated
+        self.is_alive = True
+        self.infected = infected
+
+
+def bytes_per_person(make_population, size):
+    """Returns how many bytes make_population(size) allocates per person,
+    measured with tracemalloc."""
+    gc.collect()
+    tracemalloc.start()
+    population = make_population(size)
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del population
+    return allocated / float(size)
+
+
+def person_list(person_class):
+    def make_population(size):
+        rng = random.Random(42)
+        return [person_class(_id, rng.uniform(0, 1) < 0.5, None) for _id in range(size)]
+    return make_population
+
+
+def array_population(size):
+    return Population(size, 0.5, 0.5, 0, np.random.default_rng(42))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measures the memory used per person.")
+    parser.add_argument("size", type=int, nargs="?", default=1000000)
+    args = parser.parse_args()
+    results = [("Person with __dict__", person_list(DictPerson)),
+               ("Person with __slots__", person_list(Person))]
+    if HAS_NUMPY:
+        results.append(("array engine Population", array_population))
+    baseline = None
+    for name, make_population in results:
+        size = bytes_per_person(make_population, args.size)
+        if baseline is None:
+            baseline = size
+        print("{:<26}{:>8.1f} bytes/person{:>8.1f}%".format(name, size, 100.0 * size / baseline))
@@ -0,0 +1,119 @@
+import os, pickle, random
+from array import array
+from person import Person
+from sampler import InteractionSampler
+
+CHECKPOINT_VERSION = 1
+
+# Plain values of a Simulation that are copied into a checkpoint as they are.
+SIMULATION_VALUES = ("engine", "seed", "population_size", "vacc_percentage", "virus_name",
+                     "mortality_rate", "basic_repro_num", "initial_infected", "file_name",
+                     "total_infected", "current_infected", "died", "survived", "uninfected",
+                     "vaccinated", "saved", "time_steps", "aggregate", "interactions",
+                     "step_counts")
+
+
+def save(simulation, file_name):
+    """Writes a snapshot of the simulation between two time steps to file_name.
+    The population is stored as flat arrays instead of pickled Person objects,
+    and the file is written next to the old one and then renamed over it, so a
+    crash while saving leaves the previous checkpoint intact."""
+    if getattr(simulation, "spatial", None) is not None:
+        raise ValueError("a simulation with a spatial population cannot be checkpointed")
+    snapshot = {"version": CHECKPOINT_VERSION,
+                "values": dict((name, getattr(simulation, name)) for name in SIMULATION_VALUES),
+                "random_streams": dict((name, stream.getstate())
+                                       for name, stream in simulation.random_streams.items()),
+                "logger": simulation.logger.checkpoint()}
+    if simulation.engine == "array":
+        import numpy as np
+        population = simulation.population
+        snapshot["population"] = {"state": population.state,
+                                  "is_vaccinated": np.asarray(population.is_vaccinated),
+                                  "is_alive": population.is_alive,
+                                  "infection_rate": population.infection_rate,
+                                  "living": population.living,
+                                  "rng": population.rng.bit_generator.state,
+                                  "survival_rng": population.survival_rng.bit_generator.state}
+        snapshot["infected_people"] = simulation.infected_people
+        snapshot["newly_infected"] = simulation.newly_infected
+    else:
+        people = simulation.population
+        snapshot["population"] = {
+            "is_vaccinated": bytes(bytearray(person.is_vaccinated for person in people)),
+            "is_alive": bytes(bytearray(person.is_alive for person in people)),
+            "infected": array("d", [-1.0 if person.infected is None else person.infected
+                                    for person in people])}
+        snapshot["infected_people"] = array("q", [person._id for person in simulation.infected_people])
+        snapshot["newly_infected"] = array("q", [person._id for person in simulation.newly_infected])
+        snapshot["sampler"] = array("q", [person._id for person in simulation.sampler.pool])
+        if simulation.susceptible is not None:
+            # Kept in its own order, sample() picks by position in the pool.
+            snapshot["susceptible"] = array("q", [person._id for person in simulation.susceptible.pool])
+    temporary = file_name + ".tmp"
+    with open(temporary, "wb") as f:
+        pickle.dump(snapshot, f, pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary, file_name)
+
+
+def load(file_name, logger, network=None):
+    """Rebuilds the Simulation saved in file_name.  The logger should write to the
+    same logfile as the original run did; anything logged after the checkpoint is
+    cut off so the resumed run continues the log exactly where the snapshot was
+    taken.  A contact network is not part of the snapshot; pass the same one
+    the original run used."""
+    from simulation import Simulation, RANDOM_STREAMS
+    with open(file_name, "rb") as f:
+        snapshot = pickle.load(f)
+    if snapshot.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(file_name + " is not a checkpoint this version can resume")
+    simulation = Simulation.__new__(Simulation)
+    simulation.network = network
+    simulation.spatial = None
+    simulation.aggregate = False
+    simulation.interactions = 0
+    simulation.step_counts = []
+    simulation.metrics = None
+    simulation.susceptible = None
+    for name, value in snapshot["values"].items():
+        setattr(simulation, name, value)
+    simulation.random_streams = {}
+    for name in RANDOM_STREAMS:
+        simulation.random_streams[name] = random.Random()
+        simulation.random_streams[name].setstate(snapshot["random_streams"][name])
+    saved = snapshot["population"]
+    if simulation.engine == "array":
+        import numpy as np
+        from population import Population
+        population = Population.__new__(Population)
+        population.size = simulation.population_size
+        population.redraws = 0
+        population.susceptible = None
+        for name in ("state", "is_vaccinated", "is_alive", "infection_rate", "living"):
+            setattr(population, name, saved[name])
+        population.rng = np.random.default_rng()
+        population.rng.bit_generator.state = saved["rng"]
+        population.survival_rng = np.random.default_rng()
+        population.survival_rng.bit_generator.state = saved["survival_rng"]
+        simulation.population = population
+        simulation.infected_people = snapshot["infected_people"]
+        simulation.newly_infected = snapshot["newly_infected"]
+    else:
+        people = []
+        for _id, infected in enumerate(saved["infected"]):
+            person = Person(_id, bool(saved["is_vaccinated"][_id]), None if infected < 0 else infected)
+            person.is_alive = bool(saved["is_alive"][_id])
+            people.append(person)
+        simulation.population = people
+        simulation.infected_people = [people[_id] for _id in snapshot["infected_people"]]
+        simulation.newly_infected = [people[_id] for _id in snapshot["newly_infected"]]
+        simulation.sampler = InteractionSampler([], simulation.random_streams["interaction"])
+        for _id in snapshot["sampler"]:
+            simulation.sampler.add(people[_id])
+        if "susceptible" in snapshot:
+            simulation.susceptible = InteractionSampler([], simulation.random_streams["interaction"])
+            for _id in snapshot["susceptible"]:
+                simulation.susceptible.add(people[_id])
+    logger.restore(snapshot["logger"])
+    simulation.logger = logger
+    return simulation
@@ -0,0 +1,277 @@
+import argparse, random
+import numpy as np
+from population import Population, INFECTED
+from simulation import RANDOM_STREAMS
+from logger import Logger, INFECTS, VACCINATED
+from results import ResultsStore, OUTCOME_COLUMNS
+from sweep import write_table
+
+
+class EnsemblePopulation(Population):
+    '''
+    replicates independent copies of a population, stored one after the other in
+    the arrays of a single Population.  Person i of replicate r has the _id
+    r * replicate_size + i, so by_replicate gives any array as a
+    (replicates, replicate_size) view.  Interactions never cross replicates:
+    every target is drawn from the infector's own replicate, and contact counts
+    are capped by the number of living people in it.  Everything else works on
+    all replicates at once without knowing about them.
+
+
+    _____Attributes______
+
+    Everything a Population has, where size is replicates * replicate_size, plus:
+
+    replicates: Int.  The number of copies.
+
+    replicate_size: Int.  The number of people in each copy.
+
+    replicate_living: int64 array.  The number of people still alive in each copy.
+
+    _____Methods_____
+
+    __init__(self, replicates, size, vacc_percentage, mortality_rate, initial_infected,
+        rng, survival_rng=None, population_rng=None):
+        - Every replicate gets its own vaccinations and its first initial_infected
+            people infected.
+
+    by_replicate(self, array):
+        - A (replicates, replicate_size) view of one of the per person arrays.
+
+    replicate_of(self, ids):
+        - The replicate each of ids belongs to.
+    '''
+
+    def __init__(self, replicates, size, vacc_percentage, mortality_rate, initial_infected, rng,
+                 survival_rng=None, population_rng=None):
+        Population.__init__(self, replicates * size, vacc_percentage, mortality_rate, 0, rng,
+                            survival_rng, population_rng)
+        self.replicates = replicates
+        self.replicate_size = size
+        self.replicate_living = np.full(replicates, size, dtype=np.int64)
+        self._alive = None
+        infected = self.by_replicate(np.arange(self.size))[:, :min(initial_infected, size)].ravel()
+        self.state[infected] = INFECTED
+        self.infection_rate[infected] = mortality_rate
+        self.is_vaccinated[infected] = False
+
+    def by_replicate(self, array):
+        return array.reshape(self.replicates, self.replicate_size)
+
+    def replicate_of(self, ids):
+        return ids // self.replicate_size
+
+    def interact(self, infectors, basic_repro_num, contacts=100):
+        """Population.interact, with each infector's contacts capped by the living
+        people of their own replicate."""
+        contacts = np.minimum(contacts, self.replicate_living[self.replicate_of(infectors)])
+        # Population.interact only indexes the living once half of everybody died,
+        # draws in a replicate past that point would mostly hit dead people.
+        self._alive = None
+        if (2 * self.replicate_living < self.replicate_size).any():
+            self._alive = np.flatnonzero(self.is_alive)
+        return Population.interact(self, infectors, basic_repro_num, contacts)
+
+    def _draw(self, alive, infectors, rows):
+        replicate = self.replicate_of(infectors[rows])
+        if alive is None:
+            alive = self._alive
+        if alive is None:
+            return replicate * self.replicate_size + self.rng.integers(0, self.replicate_size,
+                                                                       size=rows.shape)
+        # alive is sorted, so every replicate's living people are one slice of it.
+        starts = np.searchsorted(alive, np.arange(self.replicates + 1) * self.replicate_size)
+        first = starts[replicate]
+        count = starts[replicate + 1] - first
+        return alive[first + (self.rng.random(rows.shape) * count).astype(np.int64)]
+
+    def _row_pool(self, pool, infector):
+        replicate = self.replicate_of(infector)
+        return pool[np.searchsorted(pool, replicate * self.replicate_size):
+                    np.searchsorted(pool, (replicate + 1) * self.replicate_size)]
+
+    def resolve_infections(self, infectors):
+        survived = Population.resolve_infections(self, infectors)
+        self.replicate_living -= np.bincount(self.replicate_of(infectors[~survived]),
+                                             minlength=self.replicates)
+        return survived
+
+
+class EnsembleSimulation(object):
+    '''
+    Many independent runs of the same Simulation parameters, advanced together.
+    Every time step simulates the interactions, survivals and infections of all
+    replicates with one set of array operations on an EnsemblePopulation, so the
+    interpreter overhead of a step is paid once instead of once per replicate.
+    A replicate whose virus has burned out simply has nobody infected, costs
+    nothing and stops counting time steps, while the others carry on.
+
+    Follows the rules of the "array" engine.  Replicates share the random
+    streams, so they are independent of each other but are not the same draws
+    as separate simulations with their own seeds.
+
+
+    _____Attributes______
+
+    population_size, vacc_percentage, virus_name, mortality_rate, basic_repro_num,
+        initial_infected, seed: Same as in Simulation.  population_size is the
+        size of one replicate.
+
+    replicates: Int.  The number of runs.
+
+    population: EnsemblePopulation.
+
+    infected_people: int64 array.  Everybody currently infected, in every replicate.
+
+    time_steps, total_infected, current_infected, died, survived, vaccinated, saved,
+        interactions: int64 arrays.  The counters of Simulation, one per replicate.
+
+    step_counts: [[tuple]].  Simulation.step_counts for every replicate.
+
+    logger: Logger or None.  When given, run() writes the metadata and one
+        master_stats line per replicate to it at the end.
+
+    _____Methods_____
+
+    __init__(self, population_size, vacc_percentage, virus_name, mortality_rate,
+     basic_repro_num, initial_infected=1, replicates=10, seed=None, logger=None):
+
+    run(self):
+        - Runs every replicate until its virus burns out and returns time_steps.
+
+    summary(self, replicate):
+        - The arguments of Logger.master_stats for one replicate, as a dict.
+
+    rows(self):
+        - One row per replicate in the format of sweep.run_one, for
+            sweep.write_table and results.ResultsStore.
+    '''
+
+    def __init__(self, population_size, vacc_percentage, virus_name, mortality_rate,
+                 basic_repro_num, initial_infected=1, replicates=10, seed=None, logger=None):
+        self.population_size = population_size
+        self.vacc_percentage = vacc_percentage
+        self.virus_name = virus_name
+        self.mortality_rate = mortality_rate
+        self.basic_repro_num = basic_repro_num
+        self.initial_infected = initial_infected
+        self.replicates = replicates
+        self.logger = logger
+        self.seed = random.getrandbits(64) if seed is None else int(seed)
+        rngs = dict((name, np.random.default_rng(random.Random("{}:{}".format(self.seed, name)).getrandbits(64)))
+                    for name in RANDOM_STREAMS)
+        self.population = EnsemblePopulation(replicates, population_size, vacc_percentage,
+                                             mortality_rate, initial_infected, rngs["interaction"],
+                                             rngs["survival"], rngs["population"])
+        self.infected_people = self.population.infectors()
+        infected = min(initial_infected, population_size)
+        self.time_steps = np.zeros(replicates, dtype=np.int64)
+        self.total_infected = np.full(replicates, infected, dtype=np.int64)
+        self.current_infected = np.full(replicates, infected, dtype=np.int64)
+        self.died = np.zeros(replicates, dtype=np.int64)
+        self.survived = np.zeros(replicates, dtype=np.int64)
+        self.vaccinated = self.population.by_replicate(self.population.is_vaccinated).sum(axis=1)
+        self.saved = np.zeros(replicates, dtype=np.int64)
+        self.interactions = np.zeros(replicates, dtype=np.int64)
+        self.step_counts = [[] for _ in range(replicates)]
+
+    def _per_replicate(self, ids):
+        return np.bincount(self.population.replicate_of(ids), minlength=self.replicates)
+
+    def run(self):
+        while len(self.infected_people):
+            self.time_step()
+        if self.logger is not None:
+            with self.logger:
+                self.logger.write_metadata(self.population_size, self.vacc_percentage, self.virus_name,
+                                           self.mortality_rate, self.basic_repro_num)
+                for replicate in range(self.replicates):
+                    self.logger.master_stats(**self.summary(replicate))
+        return self.time_steps
+
+    def time_step(self):
+        """One time step of every replicate that still has somebody infected:
+        interactions, then survivals, then the newly infected fall ill."""
+        infectors = self.infected_people
+        active = np.flatnonzero(self._per_replicate(infectors))
+        _, targets, outcomes = self.population.interact(infectors, self.basic_repro_num)
+        newly_infected = np.sort(targets[outcomes == INFECTS])
+        self.saved += self._per_replicate(targets[outcomes == VACCINATED])
+        self.interactions += self._per_replicate(targets)
+        survived = self.population.resolve_infections(infectors)
+        survivors = self._per_replicate(infectors[survived])
+        died = self._per_replicate(infectors[~survived])
+        self.survived += survivors
+        self.vaccinated += survivors
+        self.died += died
+        self.current_infected -= survivors + died
+        self.population.infect(newly_infected, self.mortality_rate)
+        newly = self._per_replicate(newly_infected)
+        self.current_infected += newly
+        self.total_infected += newly
+        self.time_steps[active] += 1
+        self.infected_people = newly_infected
+        counts = zip(active.tolist(), *(array[active].tolist() for array in (
+            self.time_steps - 1, newly, self.current_infected, self.total_infected, self.died,
+            self.survived, self.vaccinated, self.saved, self.interactions)))
+        for replicate, *step in counts:
+            self.step_counts[replicate].append(tuple(step))
+
+    def summary(self, replicate):
+        return {"NumDead": int(self.died[replicate]),
+                "NumSurvived": int(self.survived[replicate]),
+                "TotalVacc": int(self.vaccinated[replicate]),
+                "TotalInfected": int(self.total_infected[replicate]),
+                "NewlyInfected": 0,
+                "LivingPop": int(self.population.replicate_living[replicate]),
+                "Saved": int(self.saved[replicate])}
+
+    def rows(self):
+        rows = []
+        for replicate in range(self.replicates):
+            outcome = dict((name, int(getattr(self, name)[replicate])) for name, _ in OUTCOME_COLUMNS)
+            rows.append({"population_size": self.population_size,
+                         "virus_name": self.virus_name,
+                         "initial_infected": self.initial_infected,
+                         "engine": "ensemble",
+                         "vacc_percentage": self.vacc_percentage,
+                         "basic_repro_num": self.basic_repro_num,
+                         "mortality_rate": self.mortality_rate,
+                         "replicate": replicate,
+                         "seed": self.seed,
+                         "infected_percent": 100.0 * outcome["total_infected"] / self.population_size,
+                         "dead_percent": 100.0 * outcome["died"] / self.population_size,
+                         "saved": outcome["saved"],
+                         "time_steps": outcome["time_steps"],
+                         "outcome": outcome,
+                         "step_counts": self.step_counts[replicate]})
+        return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs many replicates of one simulation together.")
+    parser.add_argument("pop_size", type=int)
+    parser.add_argument("vacc_percentage", type=float)
+    parser.add_argument("virus_name")
+    parser.add_argument("mortality_rate", type=float)
+    parser.add_argument("basic_repro_num", type=float)
+    parser.add_argument("initial_infected", type=int, nargs="?", default=1)
+    parser.add_argument("--replicates", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--log", default=None, metavar="FILE",
+                        help="write every replicate's final master_stats line to FILE")
+    parser.add_argument("--out", default="ensemble_results.csv")
+    parser.add_argument("--results", default=None, metavar="FILE",
+                        help="also add every replicate to the results store FILE")
+    args = parser.parse_args()
+    ensemble = EnsembleSimulation(args.pop_size, args.vacc_percentage, args.virus_name,
+                                  args.mortality_rate, args.basic_repro_num, args.initial_infected,
+                                  args.replicates, args.seed, Logger(args.log) if args.log else None)
+    ensemble.run()
+    rows = ensemble.rows()
+    write_table(rows, args.out)
+    if args.results:
+        with ResultsStore(args.results) as store:
+            store.add_results(rows)
+    for row in rows:
+        print("{replicate}\t{infected_percent:.2f}%\t{dead_percent:.2f}%\t{saved}\t{time_steps}".format(**row))
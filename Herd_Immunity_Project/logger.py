@@ -1,3 +1,59 @@
+import mmap, os, queue, struct, sys, threading
+
+# Outcome codes for a single interaction, in the order log_interaction checks them.
+INFECTS = 0
+DOES_NOT_INFECT = 1
+VACCINATED = 2
+ALREADY_INFECTED = 3
+
+# Verbosity levels, each one logs everything the levels below it do.
+LOG_SUMMARY = 0        # the metadata and the final master_stats line
+LOG_STEPS = 1          # also master_stats and the time step line of every time step
+LOG_RESOLUTIONS = 2    # also every death and survival
+LOG_INTERACTIONS = 3   # also every interaction
+VERBOSITY_LEVELS = {"summary": LOG_SUMMARY, "steps": LOG_STEPS,
+                    "resolutions": LOG_RESOLUTIONS, "interactions": LOG_INTERACTIONS}
+
+INTERACTION_LINES = (
+    "{} infects {}.\n",
+    "{} does not infect {}.\n",
+    "{} does not infect {}, because he is vaccinated.\n",
+    "{} does not infect {}, because he is already infected.\n",
+)
+
+
+def interaction_outcome(did_infect, person2_vacc, person2_sick):
+    """Returns the outcome code log_interaction logs for these arguments, or None
+    when they do not describe an interaction."""
+    if did_infect == True:
+        return INFECTS
+    elif did_infect == False and person2_vacc != True and person2_sick == None:
+        return DOES_NOT_INFECT
+    elif person2_vacc == True:
+        return VACCINATED
+    elif person2_sick != None:
+        return ALREADY_INFECTED
+    return None
+
+
+def metadata_line(pop_size, vacc_percentage, virus_name, mortality_rate, basic_repro_num):
+    return str(pop_size) + "    " + str(vacc_percentage) + "    " + str(virus_name) + "    " + str(mortality_rate) + "    " + str(basic_repro_num) + " \n"
+
+
+def time_step_line(time_step_number):
+    return "Time step " + str(time_step_number) + " ending, beginning time step " + str(time_step_number + 1) + "...\n"
+
+
+def strain_stats_line(Strain, line):
+    """Marks a master_stats line as counting only the given strain of a
+    multi-strain simulation."""
+    return "# Strain " + str(Strain) + ": " + line
+
+
+def master_stats_line(NumDead, NumSurvived, TotalVacc, Saved, TotalInfected, NewlyInfected, LivingPop):
+    return "# Killed by Contagion: " + str(NumDead) + ", # Lived through the Virus: " + str(NumSurvived) + ", # Vaccinated: " + str(TotalVacc)  + ", # of INSTANCES Someone was Saved by being Vaccinated: " + str(Saved) + ", Total # Infected by Virus Overall: " + str(TotalInfected)  + ", # Newly-Infected: " + str(NewlyInfected) + ", The # of People Living: " + str(LivingPop) + "\n"
+
+
 class Logger(object):
     '''
     Utility class responsible for logging all interactions of note during the
@@ -8,9 +64,34 @@ class Logger(object):
 
     file_name: the name of the file that the logger will be writing to.
 
+    buffer_size: None or Int.  How many lines are held in memory before they are
+        written to the logfile.  None writes every line immediately.
+
+    verbosity: Int.  One of LOG_SUMMARY, LOG_STEPS, LOG_RESOLUTIONS or
+        LOG_INTERACTIONS (the default).  Log methods for records above this level
+        return straight away.  The Simulation checks the level as well and does not
+        even call them, so a summary-only run spends nothing on logging.
+
     _____Methods_____
 
-    __init__(self, file_name):
+    __init__(self, file_name, buffer_size=None, verbosity=LOG_INTERACTIONS):
+        - With buffer_size left as None, every log method opens the logfile, writes
+            its line and closes the file again.
+        - With buffer_size set to an Int, the logger keeps one file handle open for
+            the whole run and holds up to buffer_size lines in memory before writing
+            them.  The buffer is also flushed at the end of every time step and by
+            close().  The output is identical to the unbuffered logger's.
+        - The logger can be used as a context manager, which calls close() on exit.
+
+    flush(self), close(self):
+        - Write out any buffered lines / also close the file handle.
+
+    checkpoint(self), restore(self, state):
+        - checkpoint flushes and returns what is needed to continue this log later:
+            how long the logfile is, the logger's counters and its verbosity.
+        - restore cuts the logfile back to that length and resets the counters and the
+            verbosity, so a resumed simulation appends exactly where the checkpoint was
+            taken, and logs as much as the original run did.
 
     write_metadata(self, pop_size, vacc_percentage, virus_name, mortality_rate,
         basic_repro_num):
@@ -27,6 +108,16 @@ class Logger(object):
             cases, "{person1.ID} didn't infect {person2.ID} because {'vaccinated' or 'already sick'}"
         - Appends the interaction to logfile.
 
+    log_interactions(self, infector_ids, target_ids, outcomes):
+        - Batch version of log_interaction used by the array engine.
+        - Expects three equal length sequences of Ints, with each outcome being one of
+            INFECTS, DOES_NOT_INFECT, VACCINATED or ALREADY_INFECTED.
+        - Writes the same lines log_interaction would, in the order given.
+
+    log_infection_survivals(self, ids, survived):
+        - Batch version of log_survivor and log_death used by the array engine.
+        - Expects a sequence of person ids and a matching sequence of Booleans.
+
     log_infection_survival(self, person, did_die_from_infection):
         - Expects person as Person object.
         - Expects bool for did_die_from_infection, with True denoting they died from
@@ -35,6 +126,15 @@ class Logger(object):
             "{person.ID} survived infection."
         - Appends the results of the infection to the logfile.
 
+    master_stats(self, NumDead, NumSurvived, TotalVacc, TotalInfected, NewlyInfected,
+        LivingPop, Saved=None, Strain=None):
+        - Writes one line of summary statistics from the counters the Simulation keeps.
+        - Saved is the number of interactions where a vaccination stopped an infection.
+            If it is not passed, the logger's own count from log_interaction is used.
+        - Strain is the number of a strain in a multi-strain simulation (see
+            strains.py) when the counts are for that strain only.  The line then
+            starts with "# Strain {Strain}: ".
+
     log_time_step(self, time_step_number):
         - Expects time_step_number as an Int.
         - This method should write a log telling us when one time step ends, and
@@ -50,52 +150,561 @@ class Logger(object):
                     - The total number of dead, including those that died during this time step.
     '''
 
-    def __init__(self, file_name):
+    file_mode = ""
+
+    def __init__(self, file_name, buffer_size=None, verbosity=LOG_INTERACTIONS):
         self.file_name = file_name
         self.saved = 0
+        self.verbosity = verbosity
+        self.buffer_size = buffer_size
+        self._buffer = []
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _write(self, lines, mode="a"):
+        """Writes a list of lines to the logfile.  Unbuffered, the file is opened
+        and closed again for every call.  Buffered, the file stays open and the
+        lines are kept in memory until buffer_size of them are waiting."""
+        if self.buffer_size is None:
+            with open(self.file_name, mode + self.file_mode) as f:
+                f.writelines(lines)
+            return
+        if mode == "w" and self._file is not None:
+            self._buffer = []
+            self._file.close()
+            self._file = None
+        if self._file is None:
+            self._file = open(self.file_name, mode + self.file_mode)
+        self._buffer.extend(lines)
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """Writes every buffered line to the logfile."""
+        if self._file is not None:
+            self._file.writelines(self._buffer)
+            self._file.flush()
+        self._buffer = []
+
+    def close(self):
+        """Flushes the buffer and closes the logfile, if it is open."""
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+
+    def checkpoint(self):
+        self.flush()
+        offset = 0
+        if os.path.exists(self.file_name):
+            offset = os.path.getsize(self.file_name)
+        return {"offset": offset, "saved": self.saved, "verbosity": self.verbosity}
+
+    def restore(self, state):
+        self.close()
+        with open(self.file_name, "a") as f:
+            f.truncate(state["offset"])
+        self.saved = state["saved"]
+        self.verbosity = state.get("verbosity", self.verbosity)
 
     def write_metadata(self, pop_size, vacc_percentage, virus_name, mortality_rate, basic_repro_num):
-        with open(self.file_name, "w+") as f:
-            f.write(str(pop_size) + "    " + str(vacc_percentage) + "    " + str(virus_name) + "    " + str(mortality_rate) + "    " + str(basic_repro_num) + " \n")
-        f.closed
+        self._write([metadata_line(pop_size, vacc_percentage, virus_name, mortality_rate, basic_repro_num)], "w")
 
     def log_interaction(self, person1, person2, did_infect=None, person2_vacc=None, person2_sick=None):
-        with open(self.file_name, "a") as f:
-            if did_infect == True:
-                f.write(str(person1._id) +" infects " + str(person2._id) + ".\n")
-            elif did_infect == False and person2_vacc != True and person2_sick == None:
-                f.write(str(person1._id) +" does not infect " + str(person2._id) + ".\n")
-            elif person2_vacc == True:
-                f.write(str(person1._id) + " does not infect " + str(person2._id) + ", because he is vaccinated.\n")
-                self.saved += 1
-            elif person2_sick != None:
-                f.write(str(person1._id) + " does not infect " + str(person2._id) + ", because he is already infected.\n")
-        f.closed
+        if self.verbosity < LOG_INTERACTIONS:
+            return
+        code = interaction_outcome(did_infect, person2_vacc, person2_sick)
+        if code is None:
+            return
+        if code == VACCINATED:
+            self.saved += 1
+        self._write([INTERACTION_LINES[code].format(person1._id, person2._id)])
+
+    def log_interactions(self, infector_ids, target_ids, outcomes):
+        if self.verbosity < LOG_INTERACTIONS:
+            return
+        outcomes = list(outcomes)
+        self._write([INTERACTION_LINES[outcome].format(infector, target)
+                     for infector, target, outcome in zip(infector_ids, target_ids, outcomes)])
+        self.saved += outcomes.count(VACCINATED)
 
+    def log_infection_survivals(self, ids, survived):
+        if self.verbosity < LOG_RESOLUTIONS:
+            return
+        self._write([str(_id) + (" survived and is now vaccinated!\n" if lived else " has died.\n")
+                     for _id, lived in zip(ids, survived)])
 
     def log_time_step(self, time_step_number):
-        next_time_step = time_step_number + 1
-        with open(self.file_name, "a") as f:
-            f.write("Time step " + str(time_step_number) + " ending, beginning time step " + str(next_time_step) + "...\n")
-        f.closed
+        if self.verbosity < LOG_STEPS:
+            return
+        self._write([time_step_line(time_step_number)])
+        self.flush()
 
     def log_death(self, person):
-        with open(self.file_name, "a") as f:
-            f.write(str(person._id) + " has died.\n")
-        f.closed
+        if self.verbosity < LOG_RESOLUTIONS:
+            return
+        self._write([str(person._id) + " has died.\n"])
 
     def log_survivor(self, person):
-        with open(self.file_name, "a") as f:
-            f.write(str(person._id) + " survived and is now vaccinated!\n")
-        f.closed
+        if self.verbosity < LOG_RESOLUTIONS:
+            return
+        self._write([str(person._id) + " survived and is now vaccinated!\n"])
 
-    def master_stats(self, NumDead, NumSurvived, TotalVacc, TotalInfected, NewlyInfected, LivingPop):
-        with open(self.file_name, "a") as f:
-            f.write("# Killed by Contagion: " + str(NumDead) + ", # Lived through the Virus: " + str(NumSurvived) + ", # Vaccinated: " + str(TotalVacc)  + ", # of INSTANCES Someone was Saved by being Vaccinated: " + str(self.saved) + ", Total # Infected by Virus Overall: " + str(TotalInfected)  + ", # Newly-Infected: " + str(NewlyInfected) + ", The # of People Living: " + str(LivingPop) + "\n")
-        f.closed
+    def master_stats(self, NumDead, NumSurvived, TotalVacc, TotalInfected, NewlyInfected, LivingPop, Saved=None,
+                     Strain=None):
+        if Saved is None:
+            Saved = self.saved
+        line = master_stats_line(NumDead, NumSurvived, TotalVacc, Saved, TotalInfected, NewlyInfected, LivingPop)
+        if Strain is not None:
+            line = strain_stats_line(Strain, line)
+        self._write([line])
 #self.logger.master_stats(self.died, self.saved, self.total_infected, len(self.newly_infected), self.uninfected, (len(self.population) - self.dead))
 
         # NOTE: Stretch challenge opportunity! Modify this method so that at the end of each time
         # step, it also logs a summary of what happened in that time step, including the number of
         # people infected, the number of people dead, etc.  You may want to create a helper class
         # to compute these statistics for you, as a Logger's job is just to write logs!
+
+
+class NullLogger(Logger):
+    '''
+    Logger that keeps count of saved interactions like Logger does, but never writes
+    a logfile.  Used for batch runs where only the final numbers matter.
+    '''
+
+    def _write(self, lines, mode="a"):
+        pass
+
+    def checkpoint(self):
+        return {"offset": 0, "saved": self.saved, "verbosity": self.verbosity}
+
+    def restore(self, state):
+        self.saved = state["saved"]
+        self.verbosity = state.get("verbosity", self.verbosity)
+
+
+class AsyncLogger(object):
+    '''
+    Wraps a Logger (or BinaryLogger) so that formatting and writing the log happens
+    on a background thread while the simulation keeps running.
+
+
+    _____Attributes______
+
+    logger: the Logger that does the actual writing, on the writer thread only.
+
+    saved: Int.  Same count of saved interactions a Logger keeps.
+
+    verbosity: Int.  Reads and sets the verbosity of the wrapped logger.
+
+    _____Methods_____
+
+    __init__(self, logger, queue_size=64, batch_size=10000):
+        - Log calls are turned into compact tuples of ids and outcome codes.
+            Consecutive interactions (and consecutive deaths and survivals) are
+            gathered into batches of up to batch_size and handed to the writer thread
+            through a queue holding at most queue_size batches.  When the writer falls
+            behind, the queue fills up and the simulation waits for it, so memory use
+            stays bounded.
+        - Has the same log methods as Logger, plus flush, close, checkpoint and
+            restore, which first wait for the writer thread to catch up.
+        - If the writer thread fails, the exception it raised is raised again by the
+            next log call, flush or close.
+    '''
+
+    def __init__(self, logger, queue_size=64, batch_size=10000):
+        self.logger = logger
+        self.file_name = logger.file_name
+        self.saved = logger.saved
+        self.batch_size = batch_size
+        self._queue = queue.Queue(queue_size)
+        self._thread = None
+        self._error = None
+        self._kind = None
+        self._batch = None
+
+    @property
+    def verbosity(self):
+        return self.logger.verbosity
+
+    @verbosity.setter
+    def verbosity(self, verbosity):
+        self.logger.verbosity = verbosity
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _drain(self):
+        """Body of the writer thread.  After an error it keeps emptying the queue,
+        so the simulation is never left waiting on a full queue."""
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                if self._error is None:
+                    name, args = item
+                    getattr(self.logger, name)(*args)
+            except BaseException as error:
+                self._error = error
+            finally:
+                self._queue.task_done()
+
+    def _raise_error(self):
+        if self._error is not None:
+            error = self._error
+            self._error = None
+            raise error
+
+    def _put(self, name, *args):
+        self._raise_error()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._drain, name="log writer")
+            self._thread.daemon = True
+            self._thread.start()
+        self._queue.put((name, args))
+
+    def _send_batch(self):
+        if self._batch is not None:
+            self._put(self._kind, *self._batch)
+            self._kind = None
+            self._batch = None
+
+    def _add(self, kind, *values):
+        if self._kind != kind:
+            self._send_batch()
+            self._kind = kind
+            self._batch = tuple([] for _ in values)
+        for column, value in zip(self._batch, values):
+            column.append(value)
+        if len(self._batch[0]) >= self.batch_size:
+            self._send_batch()
+
+    def flush(self):
+        """Waits until the writer thread has written everything logged so far."""
+        self._send_batch()
+        if self._thread is not None:
+            self._queue.join()
+        self._raise_error()
+        self.logger.flush()
+
+    def close(self):
+        """Writes everything that is left, stops the writer thread and closes the
+        wrapped logger."""
+        self._send_batch()
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        self.logger.close()
+        self._raise_error()
+
+    def checkpoint(self):
+        self.flush()
+        state = self.logger.checkpoint()
+        state["saved"] = self.saved
+        return state
+
+    def restore(self, state):
+        self.close()
+        self.logger.restore(state)
+        self.saved = state["saved"]
+
+    def write_metadata(self, pop_size, vacc_percentage, virus_name, mortality_rate, basic_repro_num):
+        self._send_batch()
+        self._put("write_metadata", pop_size, vacc_percentage, virus_name, mortality_rate, basic_repro_num)
+
+    def log_interaction(self, person1, person2, did_infect=None, person2_vacc=None, person2_sick=None):
+        if self.verbosity < LOG_INTERACTIONS:
+            return
+        code = interaction_outcome(did_infect, person2_vacc, person2_sick)
+        if code is None:
+            return
+        if code == VACCINATED:
+            self.saved += 1
+        self._add("log_interactions", person1._id, person2._id, code)
+
+    def log_interactions(self, infector_ids, target_ids, outcomes):
+        if self.verbosity < LOG_INTERACTIONS:
+            return
+        outcomes = list(outcomes)
+        self._send_batch()
+        self._put("log_interactions", list(infector_ids), list(target_ids), outcomes)
+        self.saved += outcomes.count(VACCINATED)
+
+    def log_infection_survivals(self, ids, survived):
+        if self.verbosity < LOG_RESOLUTIONS:
+            return
+        self._send_batch()
+        self._put("log_infection_survivals", list(ids), list(survived))
+
+    def log_time_step(self, time_step_number):
+        # Always forwarded, a BinaryLogger counts time steps even when it does not log them.
+        self._send_batch()
+        self._put("log_time_step", time_step_number)
+
+    def log_death(self, person):
+        if self.verbosity < LOG_RESOLUTIONS:
+            return
+        self._add("log_infection_survivals", person._id, False)
+
+    def log_survivor(self, person):
+        if self.verbosity < LOG_RESOLUTIONS:
+            return
+        self._add("log_infection_survivals", person._id, True)
+
+    def master_stats(self, NumDead, NumSurvived, TotalVacc, TotalInfected, NewlyInfected, LivingPop, Saved=None,
+                     Strain=None):
+        if Saved is None:
+            Saved = self.saved
+        self._send_batch()
+        self._put("master_stats", NumDead, NumSurvived, TotalVacc, TotalInfected, NewlyInfected, LivingPop, Saved,
+                  Strain)
+
+
+# Extra event codes used by the binary log next to the four interaction outcomes.
+DIED = 4
+SURVIVED = 5
+TIME_STEP = 6
+STATS_DEAD_SURVIVED = 7
+STATS_VACCINATED_SAVED = 8
+STATS_INFECTED_NEWLY = 9
+STATS_LIVING = 10
+STATS_SAVED_HIGH = 11
+
+BINARY_MAGIC = b"HERDLOG1"
+BINARY_HEADER = struct.Struct("<8sI")
+BINARY_RECORD = struct.Struct("<IIIB")
+UINT32_MAX = 0xFFFFFFFF
+
+
+def master_stats_values(stats):
+    """Turns the records of one master_stats call, as {code: (a, b)}, back into
+    (NumDead, NumSurvived, TotalVacc, Saved, TotalInfected, NewlyInfected,
+    LivingPop, strain) with strain 0 or the Strain argument plus one."""
+    dead, survived = stats[STATS_DEAD_SURVIVED]
+    vaccinated, saved = stats[STATS_VACCINATED_SAVED]
+    infected, newly = stats[STATS_INFECTED_NEWLY]
+    living, strain = stats[STATS_LIVING]
+    saved += stats.get(STATS_SAVED_HIGH, (0, 0))[0] << 32
+    return dead, survived, vaccinated, saved, infected, newly, living, strain
+
+
+class BinaryLogger(Logger):
+    '''
+    Logger that writes a compact binary event log instead of text.  Takes the same
+    arguments and has the same methods as Logger, so the Simulation can use either.
+
+
+    _____File format_____
+
+    header: the 8 bytes "HERDLOG1", a little-endian uint32 length, then the text of
+        the metadata line Logger.write_metadata would write, utf-8 encoded.
+
+    records: fixed 13 byte records (step, a, b, code) packed as little-endian
+        uint32, uint32, uint32, uint8.  step counts the log_time_step calls so far.
+        - code INFECTS, DOES_NOT_INFECT, VACCINATED or ALREADY_INFECTED: an
+            interaction, a is the infector's _id and b the target's _id.
+        - code DIED or SURVIVED: a and b are both the person's _id.
+        - code TIME_STEP: a is the time step number that ended.
+        - codes STATS_DEAD_SURVIVED, STATS_VACCINATED_SAVED, STATS_INFECTED_NEWLY and
+            STATS_LIVING: one master_stats call, stored as four records holding two of
+            its numbers each.  The second number of the STATS_LIVING record is 0, or
+            the Strain argument plus one.
+        - code STATS_SAVED_HIGH: only written, between STATS_INFECTED_NEWLY and
+            STATS_LIVING, when Saved does not fit in a uint32.  a holds Saved >> 32,
+            and the STATS_VACCINATED_SAVED record the low 32 bits.  The other
+            numbers of master_stats are at most the population size, and
+            master_stats raises ValueError if one of them does not fit.
+
+    Use EventLogReader to read the records back and binary_to_text to turn the file
+    into the text log Logger would have written.
+    '''
+
+    file_mode = "b"
+
+    def __init__(self, file_name, buffer_size=None, verbosity=LOG_INTERACTIONS):
+        super(BinaryLogger, self).__init__(file_name, buffer_size, verbosity)
+        self.step = 0
+
+    def checkpoint(self):
+        state = super(BinaryLogger, self).checkpoint()
+        state["step"] = self.step
+        return state
+
+    def restore(self, state):
+        super(BinaryLogger, self).restore(state)
+        self.step = state["step"]
+
+    def _records(self, records):
+        pack = BINARY_RECORD.pack
+        step = self.step
+        self._write([pack(step, a, b, code) for a, b, code in records])
+
+    def write_metadata(self, pop_size, vacc_percentage, virus_name, mortality_rate, basic_repro_num):
+        self.step = 0
+        text = metadata_line(pop_size, vacc_percentage, virus_name, mortality_rate, basic_repro_num).encode("utf-8")
+        self._write([BINARY_HEADER.pack(BINARY_MAGIC, len(text)), text], "w")
+
+    def log_interaction(self, person1, person2, did_infect=None, person2_vacc=None, person2_sick=None):
+        if self.verbosity < LOG_INTERACTIONS:
+            return
+        code = interaction_outcome(did_infect, person2_vacc, person2_sick)
+        if code is None:
+            return
+        if code == VACCINATED:
+            self.saved += 1
+        self._records([(person1._id, person2._id, code)])
+
+    def log_interactions(self, infector_ids, target_ids, outcomes):
+        if self.verbosity < LOG_INTERACTIONS:
+            return
+        outcomes = list(outcomes)
+        self._records(zip(infector_ids, target_ids, outcomes))
+        self.saved += outcomes.count(VACCINATED)
+
+    def log_infection_survivals(self, ids, survived):
+        if self.verbosity < LOG_RESOLUTIONS:
+            return
+        self._records([(_id, _id, SURVIVED if lived else DIED) for _id, lived in zip(ids, survived)])
+
+    def log_time_step(self, time_step_number):
+        if self.verbosity >= LOG_STEPS:
+            self._records([(time_step_number, 0, TIME_STEP)])
+        self.step += 1
+        self.flush()
+
+    def log_death(self, person):
+        if self.verbosity < LOG_RESOLUTIONS:
+            return
+        self._records([(person._id, person._id, DIED)])
+
+    def log_survivor(self, person):
+        if self.verbosity < LOG_RESOLUTIONS:
+            return
+        self._records([(person._id, person._id, SURVIVED)])
+
+    def master_stats(self, NumDead, NumSurvived, TotalVacc, TotalInfected, NewlyInfected, LivingPop, Saved=None,
+                     Strain=None):
+        if Saved is None:
+            Saved = self.saved
+        if max(NumDead, NumSurvived, TotalVacc, TotalInfected, NewlyInfected, LivingPop) > UINT32_MAX:
+            raise ValueError("BinaryLogger stores population counts as uint32, this population is too big")
+        records = [(NumDead, NumSurvived, STATS_DEAD_SURVIVED),
+                   (TotalVacc, Saved & UINT32_MAX, STATS_VACCINATED_SAVED),
+                   (TotalInfected, NewlyInfected, STATS_INFECTED_NEWLY)]
+        if Saved > UINT32_MAX:
+            records.append((Saved >> 32, 0, STATS_SAVED_HIGH))
+        records.append((LivingPop, 0 if Strain is None else Strain + 1, STATS_LIVING))
+        self._records(records)
+
+
+class EventLogReader(object):
+    '''
+    Read-only view of a binary log written by BinaryLogger.  The file is memory-mapped,
+    so records are only read from disk when they are used.
+
+
+    _____Attributes______
+
+    metadata: String.  The metadata line of the simulation, without its newline.
+
+    _____Methods_____
+
+    __len__(self), __getitem__(self, index), __iter__(self):
+        - The number of records, a single record as a (step, a, b, code) tuple, and
+            every record in order.
+
+    array(self):
+        - Returns all records as a NumPy structured array with the fields step, a, b
+            and code, backed by the memory map instead of a copy.  Needs NumPy.
+
+    close(self):
+        - Unmaps and closes the file.  The reader also works as a context manager.
+    '''
+
+    def __init__(self, file_name):
+        self._file = open(file_name, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, length = BINARY_HEADER.unpack_from(self._map, 0)
+        if magic != BINARY_MAGIC:
+            self.close()
+            raise ValueError(file_name + " is not a binary simulation log")
+        self._offset = BINARY_HEADER.size + length
+        self.metadata = self._map[BINARY_HEADER.size:self._offset].decode("utf-8").rstrip("\n")
+        self._count = (len(self._map) - self._offset) // BINARY_RECORD.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("record index out of range")
+        return BINARY_RECORD.unpack_from(self._map, self._offset + index * BINARY_RECORD.size)
+
+    def __iter__(self):
+        end = self._offset + self._count * BINARY_RECORD.size
+        return BINARY_RECORD.iter_unpack(memoryview(self._map)[self._offset:end])
+
+    def array(self):
+        import numpy as np
+        dtype = np.dtype([("step", "<u4"), ("a", "<u4"), ("b", "<u4"), ("code", "u1")])
+        return np.frombuffer(self._map, dtype=dtype, count=self._count, offset=self._offset)
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+            self._file.close()
+
+
+def binary_to_text(binary_file_name, text_file_name, chunk_lines=100000):
+    """Writes the text log Logger would have produced for the same run, from a
+    binary log written by BinaryLogger."""
+    with EventLogReader(binary_file_name) as reader, open(text_file_name, "w") as f:
+        f.write(reader.metadata + "\n")
+        lines = []
+        stats = {}
+        for step, a, b, code in reader:
+            if code <= ALREADY_INFECTED:
+                lines.append(INTERACTION_LINES[code].format(a, b))
+            elif code == DIED:
+                lines.append(str(a) + " has died.\n")
+            elif code == SURVIVED:
+                lines.append(str(a) + " survived and is now vaccinated!\n")
+            elif code == TIME_STEP:
+                lines.append(time_step_line(a))
+            else:
+                stats[code] = (a, b)
+                if code == STATS_LIVING:
+                    dead, survived, vaccinated, saved, infected, newly, living, strain = master_stats_values(stats)
+                    line = master_stats_line(dead, survived, vaccinated, saved, infected, newly, living)
+                    if strain:
+                        line = strain_stats_line(strain - 1, line)
+                    lines.append(line)
+                    stats = {}
+            if len(lines) >= chunk_lines:
+                f.writelines(lines)
+                lines = []
+        f.writelines(lines)
+
+
+if __name__ == "__main__":
+    # python3 logger.py {binary log} {text log}
+    binary_to_text(sys.argv[1], sys.argv[2])
@@ -0,0 +1,109 @@
+import argparse, math
+from results import STEP_COLUMNS
+from sweep import sweep
+
+# Outcomes compared by validate, as (name, index into a step of the trajectory).
+COMPARED = (("total_infected", 3), ("died", 4), ("survived", 5), ("saved", 7), ("interactions", 8))
+
+
+def mean_field(pop_size, vacc_percentage, mortality_rate, basic_repro_num, initial_infected=1,
+               contacts=100, max_steps=10000):
+    """Integrates the expected counts of a Simulation with the same arguments,
+    one time step at a time, instead of simulating anybody.
+
+    Every infected person meets `contacts` of the L people that are alive and not
+    newly infected, so a given susceptible person escapes a single infected
+    person with probability 1 - basic_repro_num * contacts / L and all I of them
+    with that to the power I.
+    The infected then die with probability mortality_rate and are immune
+    otherwise.  Interactions with vaccinated (or immune) people count as saved.
+
+    Returns one tuple per time step in the order of results.STEP_COLUMNS, the
+    same as Simulation.step_counts.  Counts are expectations, so they are
+    floats.  The run ends once fewer than half a person is expected to be newly
+    infected in a step.  The expected counts include no chance of the virus dying
+    out early by bad luck, so they follow the runs where it takes hold."""
+    infected = float(min(initial_infected, pop_size))
+    vaccinated = (pop_size - infected) * vacc_percentage
+    susceptible = pop_size - infected - vaccinated
+    total_infected = infected
+    died = survived = saved = interactions = 0.0
+    steps = []
+    for step in range(max_steps):
+        living = pop_size - died
+        newly = 0.0
+        count = 0.0
+        # People infected during a step leave the pool the rest of the step draws
+        # from, so on average it is about half of them smaller than the living.
+        for _ in range(2):
+            eligible = living - newly / 2.0
+            count = min(contacts, eligible)
+            if eligible <= 0 or count <= 0:
+                newly = 0.0
+                break
+            escape = max(0.0, 1.0 - basic_repro_num * count / eligible)
+            newly = susceptible * (1.0 - escape ** infected)
+        if count > 0:
+            saved += infected * count * vaccinated / eligible
+            interactions += infected * count
+        died += infected * mortality_rate
+        survived += infected * (1.0 - mortality_rate)
+        vaccinated += infected * (1.0 - mortality_rate)
+        susceptible -= newly
+        total_infected += newly
+        infected = newly
+        steps.append((step, newly, infected, total_infected, died, survived, vaccinated,
+                      saved, interactions))
+        if newly < 0.5:
+            break
+    return steps
+
+
+def validate(pop_size, vacc_percentage, mortality_rate, basic_repro_num, initial_infected=1,
+             replicates=20, engine="array", processes=None, seed=42, virus_name="virus"):
+    """Runs `replicates` agent based simulations through sweep.sweep and compares
+    their final counts with mean_field.  Returns one dict per name in COMPARED
+    holding mean_field's value, the ensemble's mean and standard deviation, and
+    z, how many standard errors of the ensemble mean apart the two are.  Also
+    returns the ensemble's and mean_field's time_steps."""
+    steps = mean_field(pop_size, vacc_percentage, mortality_rate, basic_repro_num, initial_infected)
+    rows = sweep(pop_size, virus_name, [vacc_percentage], [basic_repro_num], [mortality_rate],
+                 replicates, initial_infected, engine, processes, seed)
+    outcomes = [dict(row["outcome"], time_steps=row["time_steps"]) for row in rows]
+    comparison = []
+    for name, index in COMPARED + (("time_steps", None),):
+        values = [outcome[name] for outcome in outcomes]
+        mean = sum(values) / float(len(values))
+        deviation = math.sqrt(sum((value - mean) ** 2 for value in values) / max(1, len(values) - 1))
+        estimate = len(steps) if index is None else steps[-1][index]
+        error = deviation / math.sqrt(len(values))
+        comparison.append({"name": name, "mean_field": estimate, "mean": mean, "deviation": deviation,
+                           "z": (estimate - mean) / error if error else 0.0})
+    return comparison
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Estimates a simulation's outcome from its expected "
+                                                 "counts, with the arguments of simulation.py.")
+    parser.add_argument("pop_size", type=int)
+    parser.add_argument("vacc_percentage", type=float)
+    parser.add_argument("virus_name")
+    parser.add_argument("mortality_rate", type=float)
+    parser.add_argument("basic_repro_num", type=float)
+    parser.add_argument("initial_infected", type=int, nargs="?", default=1)
+    parser.add_argument("--validate", type=int, default=0, metavar="REPLICATES",
+                        help="also run REPLICATES simulations and compare them with the estimate")
+    parser.add_argument("--engine", choices=["list", "array"], default="array")
+    parser.add_argument("--processes", type=int, default=None, help="defaults to one per core")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    print("\t".join(STEP_COLUMNS))
+    for step in mean_field(args.pop_size, args.vacc_percentage, args.mortality_rate,
+                           args.basic_repro_num, args.initial_infected):
+        print("{}\t".format(step[0]) + "\t".join("{:.1f}".format(count) for count in step[1:]))
+    if args.validate:
+        print("\noutcome\tmean_field\tmean\tdeviation\tz")
+        for row in validate(args.pop_size, args.vacc_percentage, args.mortality_rate,
+                            args.basic_repro_num, args.initial_infected, args.validate,
+                            args.engine, args.processes, args.seed, args.virus_name):
+            print("{name}\t{mean_field:.1f}\t{mean:.1f}\t{deviation:.1f}\t{z:.2f}".format(**row))
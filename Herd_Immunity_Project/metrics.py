@@ -0,0 +1,167 @@
+import json, os, sys, time
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# The parts of a time step run() times separately, in the order they happen.
+PHASES = ("time_step", "logging", "resolve", "infect", "checkpoint")
+
+
+def peak_memory_mb():
+    """The process's peak resident memory so far, or None where the resource
+    module is missing (Windows).  ru_maxrss is in bytes on macOS and in kilobytes
+    everywhere else."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return peak / (1024.0 * 1024.0)
+    return peak / 1024.0
+
+
+class TimedLogger(object):
+    '''
+    Wraps a logger and adds up the time spent in its methods, including the
+    log calls made from inside Simulation.time_step.  Everything else is passed
+    straight through to the wrapped logger.
+    '''
+
+    def __init__(self, logger):
+        self.logger = logger
+        self.seconds = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __getattr__(self, name):
+        value = getattr(self.logger, name)
+        if not callable(value):
+            return value
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return value(*args, **kwargs)
+            finally:
+                self.seconds += time.perf_counter() - start
+        return timed
+
+
+class Metrics(object):
+    '''
+    Records where the time of every time step goes.  Pass one to a Simulation as
+    metrics, and run() reports each finished time step as a dict to every
+    callback and as one JSON object per line to file_name.  A simulation without
+    metrics uses NullMetrics, whose methods do nothing.
+
+
+    _____Attributes______
+
+    file_name: String or None.  Where the JSON lines are written.
+
+    callbacks: [callable].  Each is called with the record of every time step.
+
+    records: [Dict].  The record of every time step so far.  A record holds:
+        - step: the number of the time step.
+        - seconds: the wall time of the whole step, and <phase>_seconds for each
+            of PHASES.
+        - log_seconds: time spent inside logger methods, in any phase.
+        - log_bytes: how much the logfile grew.
+        - interactions: how many interactions were simulated.
+        - redraws: how many interaction targets the array engine had to draw again.
+        - infected, newly_infected, died, living: the simulation's counts at the
+            end of the step.
+        - peak_memory_mb: the process's peak resident memory so far, None on
+            platforms without the resource module.
+
+    _____Methods_____
+
+    attach(self, simulation), detach(self, simulation):
+        - Called by run() before the first and after the last time step.  attach
+            wraps the simulation's logger in a TimedLogger, detach unwraps it and
+            closes the metrics file.
+
+    start_step(self), lap(self, phase), end_step(self):
+        - Called by run() around and between the phases of each time step.
+    '''
+
+    def __init__(self, file_name=None, callbacks=None):
+        self.file_name = file_name
+        self.callbacks = list(callbacks or [])
+        self.records = []
+        self._file = None
+        self._simulation = None
+        self._logger = None
+
+    def attach(self, simulation):
+        self._simulation = simulation
+        self._logger = TimedLogger(simulation.logger)
+        simulation.logger = self._logger
+        if self.file_name is not None:
+            self._file = open(self.file_name, "a")
+
+    def detach(self, simulation):
+        simulation.logger = self._logger.logger
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _totals(self):
+        simulation = self._simulation
+        log_file = simulation.logger.file_name
+        return {"log_seconds": self._logger.seconds,
+                "log_bytes": os.path.getsize(log_file) if log_file and os.path.exists(log_file) else 0,
+                "interactions": int(simulation.interactions),
+                "redraws": int(getattr(simulation.population, "redraws", 0))}
+
+    def start_step(self):
+        self._record = dict((phase + "_seconds", 0.0) for phase in PHASES)
+        self._before = self._totals()
+        self._start = self._last = time.perf_counter()
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self._record[phase + "_seconds"] += now - self._last
+        self._last = now
+
+    def end_step(self):
+        simulation = self._simulation
+        record = self._record
+        record["step"] = simulation.time_steps - 1
+        record["seconds"] = self._last - self._start
+        for name, value in self._totals().items():
+            record[name] = value - self._before[name]
+        record["infected"] = simulation.current_infected
+        record["newly_infected"] = len(simulation.infected_people)
+        record["died"] = simulation.died
+        record["living"] = simulation.population_size - simulation.died
+        record["peak_memory_mb"] = peak_memory_mb()
+        self.records.append(record)
+        if self._file is not None:
+            self._file.write(json.dumps(record, sort_keys=True) + "\n")
+            self._file.flush()
+        for callback in self.callbacks:
+            callback(record)
+
+
+class NullMetrics(Metrics):
+    '''Metrics that record nothing, so an uninstrumented run only pays for a few
+    empty method calls per time step.'''
+
+    def attach(self, simulation):
+        pass
+
+    def detach(self, simulation):
+        pass
+
+    def start_step(self):
+        pass
+
+    def lap(self, phase):
+        pass
+
+    def end_step(self):
+        pass
@@ -0,0 +1,163 @@
+import numpy as np
+
+
+class ContactNetwork(object):
+    '''
+    Who can meet whom, stored in compressed sparse row (CSR) form.  The neighbours
+    of person i are neighbours[offsets[i]:offsets[i + 1]], one contiguous slice, and
+    the whole network takes one integer per edge end plus one per person.
+
+
+    _____Attributes______
+
+    size: Int.  The number of people in the network.
+
+    offsets: int64 array of length size + 1.
+
+    neighbours: int32 array (int64 for more than 2**31 people) holding every
+        person's neighbours one after the other.
+
+    _____Methods_____
+
+    __init__(self, size, offsets, neighbours):
+        - Usually built with from_edges or one of the generators below instead.
+
+    from_edges(size, sources, targets), a static method:
+        - Builds an undirected network from two arrays of edge end points.  Self
+            loops and repeated edges are dropped.
+
+    degree(self, ids=None):
+        - The number of neighbours of the given people, or of everyone.
+
+    neighbours_of(self, _id):
+        - The neighbours of one person, as a view into neighbours.
+
+    gather(self, ids):
+        - The neighbours of many people at once.  Returns (rows, neighbours) where
+            rows[k] is the index into ids whose neighbour neighbours[k] is.
+    '''
+
+    def __init__(self, size, offsets, neighbours):
+        self.size = size
+        self.offsets = offsets
+        self.neighbours = neighbours
+
+    @staticmethod
+    def from_edges(size, sources, targets):
+        """Keeps every edge once as a (low id, high id) pair sorted by low id, then
+        writes each pair into the slices of both of its people.  Every slice ends
+        up sorted.  Apart from the two sorts this is a few passes over the edges."""
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        keep = sources != targets
+        sources = sources[keep]
+        targets = targets[keep]
+        pairs = np.sort(np.minimum(sources, targets) * size + np.maximum(sources, targets))
+        if len(pairs):
+            first = np.ones(len(pairs), dtype=bool)
+            first[1:] = pairs[1:] != pairs[:-1]
+            pairs = pairs[first]
+        low = pairs // size
+        high = pairs % size
+        del pairs
+        low_counts = np.bincount(low, minlength=size)
+        high_counts = np.bincount(high, minlength=size)
+        offsets = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(low_counts + high_counts, out=offsets[1:])
+        dtype = np.int32 if size < 2 ** 31 else np.int64
+        neighbours = np.empty(2 * len(low), dtype=dtype)
+        # Neighbours with a lower id come first in every slice, then those with a higher id.
+        order = np.argsort(high, kind="stable")
+        by_high = high[order]
+        rank = np.arange(len(low)) - (np.cumsum(high_counts) - high_counts)[by_high]
+        neighbours[offsets[by_high] + rank] = low[order]
+        del order, by_high
+        rank = np.arange(len(low)) - (np.cumsum(low_counts) - low_counts)[low]
+        neighbours[offsets[low] + high_counts[low] + rank] = high
+        return ContactNetwork(size, offsets, neighbours)
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def edges(self):
+        return len(self.neighbours) // 2
+
+    def degree(self, ids=None):
+        if ids is None:
+            return np.diff(self.offsets)
+        return self.offsets[np.asarray(ids) + 1] - self.offsets[ids]
+
+    def neighbours_of(self, _id):
+        return self.neighbours[self.offsets[_id]:self.offsets[_id + 1]]
+
+    def gather(self, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        starts = self.offsets[ids]
+        counts = self.offsets[ids + 1] - starts
+        rows = np.repeat(np.arange(len(ids)), counts)
+        # Position of every slot within its own slice, added to that slice's start.
+        first = np.cumsum(counts) - counts
+        slots = np.arange(len(rows)) - first[rows] + starts[rows]
+        return rows, self.neighbours[slots]
+
+
+def random_regular(size, degree, rng):
+    """Pairs up `degree` stubs per person at random (the configuration model).
+    Self loops and repeated pairs are dropped, so a few people end up with a
+    slightly smaller degree."""
+    stubs = rng.permutation(np.repeat(np.arange(size, dtype=np.int64), degree))
+    if len(stubs) % 2:
+        stubs = stubs[:-1]
+    return ContactNetwork.from_edges(size, stubs[0::2], stubs[1::2])
+
+
+def small_world(size, degree, rewire, rng):
+    """Watts-Strogatz network: everyone is linked to their degree // 2 nearest
+    neighbours on each side of a ring, then each link is moved to a random
+    person with probability rewire."""
+    sources = np.repeat(np.arange(size, dtype=np.int64), degree // 2)
+    targets = (sources + np.tile(np.arange(1, degree // 2 + 1), size)) % size
+    moved = rng.random(len(targets)) < rewire
+    targets[moved] = rng.integers(0, size, size=np.count_nonzero(moved))
+    return ContactNetwork.from_edges(size, sources, targets)
+
+
+def scale_free(size, degree, rng, exponent=2.5):
+    """Chung-Lu network with a power-law degree distribution: both ends of
+    size * degree / 2 edges are drawn with probability proportional to a weight
+    that falls off as rank ** (-1 / (exponent - 1)).  The mean degree is about
+    `degree`, a few hubs have far more.  Ranks are drawn by inverting the
+    continuous version of the weights, which is much faster than a search
+    through their cumulative sum."""
+    power = 1.0 - 1.0 / (exponent - 1.0)
+    top = (size + 1.0) ** power - 1.0
+    edges = size * degree // 2
+    ends = []
+    for _ in range(2):
+        ranks = ((1.0 + rng.random(edges) * top) ** (1.0 / power) - 1.0).astype(np.int64)
+        ends.append(np.minimum(ranks, size - 1))
+    people = rng.permutation(size)
+    return ContactNetwork.from_edges(size, people[ends[0]], people[ends[1]])
+
+
+def load_edge_list(file_name, size=None):
+    """Loads a network from a file of whitespace separated "source target" id
+    pairs, or from a .npy file holding an (edges, 2) array."""
+    if file_name.endswith(".npy"):
+        edges = np.load(file_name, mmap_mode="r")
+    else:
+        edges = np.fromfile(file_name, dtype=np.int64, sep=" ").reshape(-1, 2)
+    if size is None:
+        size = int(edges.max()) + 1 if len(edges) else 0
+    return ContactNetwork.from_edges(size, edges[:, 0], edges[:, 1])
+
+
+GENERATORS = {"regular": random_regular, "small-world": small_world, "scale-free": scale_free}
+
+
+def generate(kind, size, degree, rng, rewire=0.1):
+    """Builds one of the GENERATORS by name."""
+    if kind == "small-world":
+        return small_world(size, degree, rewire, rng)
+    return GENERATORS[kind](size, degree, rng)
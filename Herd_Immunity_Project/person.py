@@ -28,9 +28,9 @@ class Person(object):
             the object should create a Virus object and set it as the value for
             self.infection.  Otherwise, self.infection should be set to None.
 
-    did_survive_infection(self):
+    did_survive_infection(self, rng=random):
         - Only called if infection attribute is not None.
-        - Takes no inputs.
+        - Optionally takes the random.Random to draw from, the random module otherwise.
         - Generates a random number between 0 and 1.
         - Compares random number to mortality_rate attribute stored in person's infection
             attribute.
@@ -38,8 +38,15 @@ class Person(object):
                 is_alive is changed to false.
             - If random number is larger, person has survived disease.  Person's
             is_vaccinated attribute is changed to True, and set self.infected to None.
+
+    Person uses __slots__ instead of a per-instance __dict__, which saves about 40
+    bytes per person (run benchmark_memory.py to measure it).  The attributes above
+    are still read and written the same way.  For populations too big even for that,
+    use the array engine of the Simulation.
     '''
 
+    __slots__ = ("_id", "is_vaccinated", "is_alive", "infected")
+
     def __init__(self, _id, is_vaccinated, infected=None):
         self._id = _id
         self.is_vaccinated = is_vaccinated
@@ -47,14 +54,14 @@ class Person(object):
         self.infected = infected
 
 
-    def did_survive_infection(self):
+    def did_survive_infection(self, rng=random):
         """Gets a random float between 0 and 1. If it is less than the
         mortality rate of the virus, return False, kill the person and change
         his infected status to False. If it is greater than the mortality rate
         of the virus, return True and change the vaccinated attribute to True
         and the infected status to False."""
         if self.infected != None:
-            if random.uniform(0,1) < self.infected:
+            if rng.uniform(0,1) < self.infected:
                 self.is_alive = False
                 self.infected = None
                 return False
@@ -0,0 +1,441 @@
+import numpy as np
+from person import Person
+from logger import INFECTS, DOES_NOT_INFECT, VACCINATED, ALREADY_INFECTED
+
+HEALTHY = 0
+INFECTED = 1
+DEAD = 2
+
+MAX_RESAMPLE_ROUNDS = 50
+# interact_counts lets a block of infectors use out of date counts for at most
+# this fraction of the people they can interact with.
+BLOCK_DEPLETION = 0.001
+# Below this many infectors per block, interact_counts draws every contact instead.
+MIN_COUNTS_BLOCK = 1
+
+
+class Population(object):
+    '''
+    Array-backed population used by the "array" engine of the Simulation.  Holds
+    the same information as a list of Person objects, but as one NumPy array per
+    attribute so a whole time step can be simulated with batched array operations.
+
+
+    _____Attributes______
+
+    size: Int.  The number of people in the population.  A person's _id is their
+        index into every array.
+
+    state: int8 array.  HEALTHY, INFECTED or DEAD for every person.
+
+    is_vaccinated: bool array.  Same meaning as Person.is_vaccinated.
+
+    is_alive: bool array.  Same meaning as Person.is_alive.
+
+    infection_rate: float64 array.  The mortality rate of the infection a person is
+        carrying, the same value a Person stores in .infected.  Zero when healthy.
+
+    living: Int.  The number of people still alive.
+
+    redraws: Int.  Running count of interaction targets interact had to draw
+        again because they were dead, repeated or already taken.
+
+    susceptible: int64 array or None.  The sorted _ids of everybody that can still be
+        infected, built by the first interact_counts and kept up to date by infect.
+
+    rng: numpy Generator.  Source of the interaction draws.
+
+    survival_rng: numpy Generator.  Source of the draws in resolve_infections.
+
+    _____Methods_____
+
+    __init__(self, size, vacc_percentage, mortality_rate, initial_infected, rng,
+        survival_rng=None, population_rng=None, is_vaccinated=None):
+        - The first initial_infected people are infected and unvaccinated, every
+            other person is vaccinated with probability vacc_percentage, decided by
+            one vectorized draw for the whole population.
+        - survival_rng and population_rng default to rng.  Passing separate generators
+            keeps each kind of draw on its own reproducible stream.
+        - is_vaccinated can be passed in instead of being drawn, in which case size
+            and vacc_percentage are ignored.
+
+    load(file_name, mortality_rate, initial_infected, rng, survival_rng=None), a
+        static method:
+        - Creates a Population from a file written by save.  The file is memory
+            mapped copy-on-write, so loading it does not read it or draw anything,
+            the file itself is never changed, and several processes loading the
+            same file share its pages.
+
+    save(self, file_name):
+        - Writes who is vaccinated to a .npy file that load can use.  Call it before
+            the simulation runs, while it still holds the initial population.
+
+    infectors(self):
+        - Returns the ids of everybody currently infected, in _id order.
+
+    interact(self, infectors, basic_repro_num, contacts=100):
+        - Has every infector interact with up to `contacts` unique living people
+            that were not newly infected earlier in the same time step.
+        - Returns (infector_ids, target_ids, outcomes) as flat arrays in the order the
+            interactions would have happened one infector at a time.
+        - contacts can also be an array with a separate count for every infector.
+
+    interact_counts(self, infectors, basic_repro_num, contacts=100):
+        - Same rules as interact, but only draws how many contacts each infector
+            has with each kind of person, then picks just the people infected.
+        - Returns (newly_infected_ids, saved, contacts) where saved is the number of
+            contacts with vaccinated people.
+
+    interact_network(self, infectors, network, basic_repro_num, contacts=100):
+        - Same as interact, with contacts limited to each infector's neighbours in a
+            network.ContactNetwork.
+
+    resolve_infections(self, infectors):
+        - Decides whether each infector dies or survives, updates their state and
+            returns a bool array that is True for the survivors.
+
+    infect(self, ids, mortality_rate):
+        - Marks the people in ids as infected with the given mortality rate.
+    '''
+
+    def __init__(self, size, vacc_percentage, mortality_rate, initial_infected, rng,
+                 survival_rng=None, population_rng=None, is_vaccinated=None):
+        if is_vaccinated is not None:
+            size = len(is_vaccinated)
+        self.size = size
+        self.rng = rng
+        self.survival_rng = rng if survival_rng is None else survival_rng
+        if population_rng is None:
+            population_rng = rng
+        self.state = np.full(size, HEALTHY, dtype=np.int8)
+        self.is_alive = np.ones(size, dtype=bool)
+        self.infection_rate = np.zeros(size, dtype=np.float64)
+        self.living = size
+        self.redraws = 0
+        self.susceptible = None
+        initial_infected = min(initial_infected, size)
+        self.state[:initial_infected] = INFECTED
+        self.infection_rate[:initial_infected] = mortality_rate
+        if is_vaccinated is None:
+            self.is_vaccinated = np.zeros(size, dtype=bool)
+            self.is_vaccinated[initial_infected:] = population_rng.random(size - initial_infected) < vacc_percentage
+        else:
+            self.is_vaccinated = is_vaccinated
+            self.is_vaccinated[:initial_infected] = False
+
+    @staticmethod
+    def load(file_name, mortality_rate, initial_infected, rng, survival_rng=None):
+        is_vaccinated = np.load(file_name, mmap_mode="c")
+        return Population(None, None, mortality_rate, initial_infected, rng, survival_rng,
+                          is_vaccinated=is_vaccinated)
+
+    def save(self, file_name):
+        np.save(file_name, np.asarray(self.is_vaccinated))
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, _id):
+        """Returns a Person snapshot of the person with the given _id."""
+        infected = None
+        if self.state[_id] == INFECTED:
+            infected = float(self.infection_rate[_id])
+        person = Person(int(_id), bool(self.is_vaccinated[_id]), infected)
+        person.is_alive = bool(self.is_alive[_id])
+        return person
+
+    def infectors(self):
+        """Returns the ids of everyone currently infected, in _id order."""
+        return np.flatnonzero(self.state == INFECTED)
+
+    def interact(self, infectors, basic_repro_num, contacts=100):
+        """Simulates every interaction of a time step at once.  Each infector gets
+        a row of `contacts` random living targets and a random float per target.
+        Rows are repaired until each is valid given the rows before it: slots that
+        repeat a target in the row, or hit someone an earlier infector already
+        infected this step, are drawn again.  That matches the retry loop of the
+        list engine, so the infections have the same distribution.
+
+        While at least half the population is alive, targets are drawn from every
+        _id and dead ones are drawn again, so the step never scans the population.
+        Otherwise the draws come from an index of the living.
+
+        With a count per infector, rows are as wide as the largest count and the
+        slots past a row's own count are ignored."""
+        counts = np.minimum(contacts, self.living)
+        count = int(np.max(counts)) if len(infectors) else 0
+        if count == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, np.zeros(0, dtype=np.int8)
+        used = True
+        if np.ndim(counts):
+            used = np.arange(count) < counts[:, None]
+        if 2 * self.living >= self.size:
+            alive = None
+        else:
+            alive = np.flatnonzero(self.is_alive)
+        rows = np.repeat(np.arange(len(infectors)), count).reshape(len(infectors), count)
+        targets = self._draw(alive, infectors, rows)
+        rolls = self.rng.random(rows.shape)
+        redrawn = candidates = None
+        for attempt in range(MAX_RESAMPLE_ROUNDS + 1):
+            invalid, hit, candidates = self._invalid_slots(infectors, rows, targets, rolls, basic_repro_num,
+                                                           used, redrawn, candidates)
+            redraw = np.count_nonzero(invalid)
+            if redraw == 0:
+                break
+            if attempt == MAX_RESAMPLE_ROUNDS:
+                first_bad_row = int(rows[invalid].min())
+                if alive is None:
+                    alive = np.flatnonzero(self.is_alive)
+                hit = self._interact_in_order(infectors, targets, hit, first_bad_row,
+                                              basic_repro_num, alive,
+                                              np.broadcast_to(counts, len(infectors)))
+                keep = (targets >= 0) & used
+                return (infectors[rows[keep]], targets[keep],
+                        self._outcomes(targets[keep], hit[keep]))
+            self.redraws += redraw
+            targets[invalid] = self._draw(alive, infectors, rows[invalid])
+            rolls[invalid] = self.rng.random(redraw)
+            redrawn = np.flatnonzero(invalid.any(axis=1))
+        if used is not True:
+            return infectors[rows[used]], targets[used], self._outcomes(targets[used], hit[used])
+        return infectors[rows].ravel(), targets.ravel(), self._outcomes(targets, hit).ravel()
+
+    def _draw(self, alive, infectors, rows):
+        """Draws a random target for every slot of rows, from everybody or from
+        the living ids in alive.  rows index into infectors."""
+        if alive is None:
+            return self.rng.integers(0, self.size, size=rows.shape)
+        return alive[self.rng.integers(0, len(alive), size=rows.shape)]
+
+    def _row_pool(self, pool, infector):
+        """The part of pool, a sorted array of ids, that infector can meet."""
+        return pool
+
+    def _susceptible(self, ids):
+        return (self.state[ids] == HEALTHY) & ~self.is_vaccinated[ids]
+
+    def _hit(self, infectors, rows, targets, rolls, basic_repro_num):
+        """Returns which interactions infect their target, given each one's
+        random float.  rows index into infectors."""
+        return (rolls < basic_repro_num) & self._susceptible(targets)
+
+    def _invalid_slots(self, infectors, rows, targets, rolls, basic_repro_num, used=True,
+                       redrawn=None, candidates=None):
+        """Returns (invalid, hit, candidates) masks over the slots of the
+        interaction table, where candidates are the valid slots that infect their
+        target unless an earlier row infects it first.  Slots outside the used
+        mask are never invalid and never hit.
+
+        redrawn lists the rows that had slots drawn again since the call that
+        returned candidates.  Every other row was free of repeated and dead
+        targets and kept its draws, so only redrawn rows are checked again.  None
+        checks every row."""
+        if redrawn is None:
+            redrawn = slice(None)
+            candidates = np.zeros(targets.shape, dtype=bool)
+        checked = targets[redrawn]
+        order = np.argsort(checked, axis=1, kind="stable")
+        ordered = np.take_along_axis(checked, order, axis=1)
+        repeats = np.zeros(checked.shape, dtype=bool)
+        repeats[:, 1:] = ordered[:, 1:] == ordered[:, :-1]
+        bad = np.zeros(checked.shape, dtype=bool)
+        np.put_along_axis(bad, order, repeats, axis=1)
+        bad |= ~self.is_alive[checked]
+        checked_used = used if used is True else used[redrawn]
+        bad &= checked_used
+        invalid = np.zeros(targets.shape, dtype=bool)
+        invalid[redrawn] = bad
+        candidates[redrawn] = ~bad & checked_used & self._hit(infectors, rows[redrawn], checked,
+                                                              rolls[redrawn], basic_repro_num)
+        # The earliest row that infects a target owns it, later rows may not draw it.
+        taken = (self._owner_rows(rows, targets, candidates) < rows) & used
+        invalid |= taken
+        return invalid, candidates & ~taken, candidates
+
+    def _owner_rows(self, rows, targets, hit):
+        """For every slot, returns the earliest row with a hit on the slot's
+        target, or a number larger than any row if nobody hits it.  rows must not
+        decrease from one slot to the next, in the flattened order of the table."""
+        owner = np.full(targets.shape, np.iinfo(np.int64).max, dtype=np.int64)
+        hit_targets = targets[hit]
+        hit_rows = rows[hit]
+        # Rows are already in order, so a stable sort by target sorts by row within a target.
+        first = np.argsort(hit_targets, kind="stable")
+        hit_targets = hit_targets[first]
+        hit_rows = hit_rows[first]
+        earliest = np.ones(len(hit_targets), dtype=bool)
+        earliest[1:] = hit_targets[1:] != hit_targets[:-1]
+        infected_ids = hit_targets[earliest]
+        infected_by = hit_rows[earliest]
+        if len(infected_ids) and targets.size >= self.size:
+            # A lookup table over every _id is cheaper than searching for this many targets.
+            by_id = np.full(self.size, np.iinfo(np.int64).max, dtype=np.int64)
+            by_id[infected_ids] = infected_by
+            owner = by_id[targets]
+        elif len(infected_ids):
+            where = np.searchsorted(infected_ids, targets)
+            where[where == len(infected_ids)] = 0
+            found = infected_ids[where] == targets
+            owner[found] = infected_by[where[found]]
+        return owner
+
+    def interact_counts(self, infectors, basic_repro_num, contacts=100):
+        """Fast path of interact for when single interactions are not needed.  An
+        infector's contacts are unique people drawn from everyone alive and not
+        newly infected, so how many of them are susceptible, vaccinated or
+        infected follows a hypergeometric distribution, and the number of
+        infections a binomial one.  Only the people infected are then picked,
+        uniformly from the susceptible ones not picked yet.
+
+        Infectors are handled in blocks that share one set of counts, small
+        enough that the infections within a block change the counts by less than
+        BLOCK_DEPLETION.  Random draws per step drop from contacts per infector to
+        a few per block plus one per infection.  When the blocks would hold fewer
+        than MIN_COUNTS_BLOCK infectors, which happens in small populations, the
+        step goes through interact instead."""
+        if self.susceptible is None:
+            self.susceptible = np.flatnonzero((self.state == HEALTHY) & ~self.is_vaccinated)
+        pool = self.susceptible
+        eligible = self.living
+        count = min(contacts, eligible)
+        if len(pool) and count and basic_repro_num > 0:
+            block = int(BLOCK_DEPLETION * eligible / (count * basic_repro_num))
+            if block < MIN_COUNTS_BLOCK and len(infectors) > block:
+                # Blocks this small would overshoot BLOCK_DEPLETION or cost more than they save.
+                _, targets, outcomes = self.interact(infectors, basic_repro_num, contacts)
+                return (np.sort(targets[outcomes == INFECTS]), int((outcomes == VACCINATED).sum()),
+                        len(targets))
+        vaccinated = self.living - len(pool) - len(infectors)
+        infected_count = 0
+        saved = 0
+        contacts_made = 0
+        start = 0
+        while start < len(infectors):
+            eligible = self.living - infected_count
+            susceptible = len(pool) - infected_count
+            count = min(contacts, eligible)
+            if count == 0:
+                break
+            rows = len(infectors) - start
+            if susceptible and basic_repro_num > 0:
+                block = int(BLOCK_DEPLETION * eligible / (count * basic_repro_num))
+                rows = min(rows, max(1, block))
+            start += rows
+            contacts_made += rows * count
+            if rows == 1:
+                # Same split as below, scalar draws are several times cheaper.
+                hit_vaccinated = self.rng.hypergeometric(vaccinated, eligible - vaccinated, count)
+                hit_susceptible = self.rng.hypergeometric(susceptible, eligible - vaccinated - susceptible,
+                                                          count - hit_vaccinated)
+            else:
+                hit_vaccinated, hit_susceptible, _ = self.rng.multivariate_hypergeometric(
+                    [vaccinated, susceptible, eligible - vaccinated - susceptible], count,
+                    size=rows).sum(axis=0)
+            saved += int(hit_vaccinated)
+            # The infections of a block add up to one binomial draw.
+            infected_count += min(int(self.rng.binomial(hit_susceptible, basic_repro_num)), susceptible)
+        # Which of the susceptible get infected does not change any count above, so
+        # they are all picked at the end, uniformly and without repeats.
+        return np.sort(self._pick(pool, infected_count)), saved, contacts_made
+
+    def _pick(self, pool, needed):
+        """needed different people from pool, picked uniformly."""
+        picked = np.zeros(len(pool), dtype=bool)
+        picked_count = 0
+        infected = []
+        while needed:
+            if 2 * picked_count > len(pool):
+                pool = pool[~picked]
+                picked = np.zeros(len(pool), dtype=bool)
+                picked_count = 0
+            picks = np.unique(self.rng.integers(0, len(pool), size=needed))
+            picks = picks[~picked[picks]]
+            picked[picks] = True
+            picked_count += len(picks)
+            infected.append(pool[picks])
+            needed -= len(picks)
+        if not infected:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate(infected)
+
+    def interact_network(self, infectors, network, basic_repro_num, contacts=100):
+        """Same as interact, but every infector only meets their living neighbours
+        in a network.ContactNetwork, up to `contacts` of them picked at random.
+        Neighbours are fixed, so instead of being drawn again, a neighbour that
+        an earlier infector already infected this step is simply not met.  Needs
+        no retries: one pass over the neighbour slices does the whole step."""
+        rows, targets = network.gather(infectors)
+        alive = self.is_alive[targets]
+        rows = rows[alive]
+        targets = targets[alive].astype(np.int64)
+        # Shuffle within each row, then keep the first `contacts` of every row.
+        order = np.lexsort((self.rng.random(len(rows)), rows))
+        rows = rows[order]
+        targets = targets[order]
+        rank = np.arange(len(rows)) - np.searchsorted(rows, rows)
+        keep = rank < contacts
+        rows = rows[keep]
+        targets = targets[keep]
+        hit = self._hit(infectors, rows, targets, self.rng.random(len(rows)), basic_repro_num)
+        owner = self._owner_rows(rows, targets, hit)
+        met = rows <= owner
+        rows = rows[met]
+        targets = targets[met]
+        hit = hit[met] & (owner[met] == rows)
+        return infectors[rows], targets, self._outcomes(targets, hit)
+
+    def _interact_in_order(self, infectors, targets, hit, first_bad_row, basic_repro_num,
+                           alive, counts):
+        """Fallback for rows the batched repair could not settle, usually because
+        fewer than `contacts` people are left to interact with.  Rows before
+        first_bad_row are already final; the rest are drawn one infector at a time
+        without replacement.  Unused slots are marked with a target of -1."""
+        pool = alive[~np.isin(alive, targets[:first_bad_row][hit[:first_bad_row]])]
+        for row in range(first_bad_row, len(infectors)):
+            candidates = self._row_pool(pool, infectors[row])
+            count = min(int(counts[row]), len(candidates))
+            picks = candidates[self.rng.choice(len(candidates), size=count, replace=False)]
+            row_hit = self._hit(infectors, np.full(count, row), picks, self.rng.random(count),
+                                basic_repro_num)
+            targets[row] = -1
+            targets[row, :count] = picks
+            hit[row] = False
+            hit[row, :count] = row_hit
+            pool = pool[~np.isin(pool, picks[row_hit])]
+        return hit
+
+    def _outcomes(self, targets, hit):
+        outcomes = np.where(hit, INFECTS, DOES_NOT_INFECT).astype(np.int8)
+        outcomes[self.state[targets] == INFECTED] = ALREADY_INFECTED
+        outcomes[self.is_vaccinated[targets]] = VACCINATED
+        return outcomes
+
+    def resolve_infections(self, infectors):
+        """Gets a random float for every infector.  Below their infection's
+        mortality rate they die, otherwise they become vaccinated.  Either way
+        they are no longer infected.  Returns True for each survivor."""
+        survived = self.survival_rng.random(len(infectors)) >= self.infection_rate[infectors]
+        survivors = infectors[survived]
+        dead = infectors[~survived]
+        self.is_vaccinated[survivors] = True
+        self.state[survivors] = HEALTHY
+        self.state[dead] = DEAD
+        self.is_alive[dead] = False
+        self.living -= len(dead)
+        self.infection_rate[infectors] = 0
+        return survived
+
+    def infect(self, ids, mortality_rate):
+        """Marks everybody in ids as infected with the given mortality rate."""
+        self.state[ids] = INFECTED
+        self.infection_rate[ids] = mortality_rate
+        if self.susceptible is not None and len(ids):
+            ids = np.asarray(ids)
+            where = np.searchsorted(self.susceptible, ids)
+            found = where < len(self.susceptible)
+            found[found] = self.susceptible[where[found]] == ids[found]
+            keep = np.ones(len(self.susceptible), dtype=bool)
+            keep[where[found]] = False
+            self.susceptible = self.susceptible[keep]
@@ -0,0 +1,173 @@
+import argparse, sqlite3
+
+# Parameters and final counts of a run, as columns of the runs table.
+PARAMETER_COLUMNS = (("virus_name", "TEXT"), ("population_size", "INTEGER"),
+                     ("vacc_percentage", "REAL"), ("basic_repro_num", "REAL"),
+                     ("mortality_rate", "REAL"), ("initial_infected", "INTEGER"),
+                     ("engine", "TEXT"), ("seed", "TEXT"), ("replicate", "INTEGER"))
+OUTCOME_COLUMNS = (("time_steps", "INTEGER"), ("total_infected", "INTEGER"), ("died", "INTEGER"),
+                   ("survived", "INTEGER"), ("vaccinated", "INTEGER"), ("saved", "INTEGER"),
+                   ("interactions", "INTEGER"))
+RUN_COLUMNS = tuple(name for name, _ in PARAMETER_COLUMNS + OUTCOME_COLUMNS)
+# The per time step counters a Simulation keeps in step_counts, in order.
+STEP_COLUMNS = ("step", "newly_infected", "current_infected", "total_infected", "died",
+                "survived", "vaccinated", "saved", "interactions")
+# Parameters a query will usually filter on get an index each.
+INDEXED_COLUMNS = ("vacc_percentage", "basic_repro_num", "mortality_rate", "population_size",
+                   "virus_name")
+
+
+class ResultsStore(object):
+    '''
+    One SQLite file holding the parameters, final counts and per time step counts
+    of any number of runs, so runs can be compared with a query instead of by
+    parsing their logfiles.  Runs are only ever appended.
+
+
+    _____Attributes______
+
+    file_name: String.  The SQLite file.  Created with its tables and indexes the
+        first time it is opened.
+
+    _____Methods_____
+
+    add_run(self, parameters, outcome, step_counts):
+        - Stores one run and returns its run_id.  parameters and outcome are dicts
+            keyed by the names in PARAMETER_COLUMNS and OUTCOME_COLUMNS, missing
+            ones are stored as NULL.  step_counts is a list of tuples in the order
+            of STEP_COLUMNS.
+
+    add_runs(self, runs):
+        - Same as add_run for a list of (parameters, outcome, step_counts), all in
+            one transaction.
+
+    add_results(self, rows):
+        - Same as add_runs for result rows in the format of sweep.run_one, each a
+            dict holding the PARAMETER_COLUMNS plus "outcome" and "step_counts".
+
+    add_simulation(self, simulation, replicate=None):
+        - Stores a Simulation that has finished running.
+
+    runs(self, **conditions):
+        - Returns the matching runs as a list of dicts, oldest first.  Each
+            condition is column=value for equality, or column=(low, high) for a
+            range where either end can be None, e.g.
+                runs(vacc_percentage=(0.6, None), basic_repro_num=(None, 0.3))
+
+    steps(self, run_id):
+        - Returns the per time step counts of one run as a list of dicts.
+
+    close(self):
+        - Closes the database.  The store can be used as a context manager.
+    '''
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self._connection = sqlite3.connect(file_name, timeout=60)
+        self._connection.row_factory = sqlite3.Row
+        columns = ", ".join("{} {}".format(name, kind) for name, kind in PARAMETER_COLUMNS + OUTCOME_COLUMNS)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS runs (run_id INTEGER PRIMARY KEY, {})".format(columns))
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS steps (run_id INTEGER, {}, PRIMARY KEY (run_id, step)) "
+                "WITHOUT ROWID".format(", ".join(name + " INTEGER" for name in STEP_COLUMNS)))
+            for name in INDEXED_COLUMNS:
+                self._connection.execute(
+                    "CREATE INDEX IF NOT EXISTS runs_{0} ON runs ({0})".format(name))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self._connection.close()
+
+    def add_run(self, parameters, outcome, step_counts):
+        return self.add_runs([(parameters, outcome, step_counts)])[0]
+
+    def add_runs(self, runs):
+        """Stores many (parameters, outcome, step_counts) runs in one transaction
+        and returns their run_ids."""
+        run_ids = []
+        with self._connection:
+            for parameters, outcome, step_counts in runs:
+                values = dict(parameters, **outcome)
+                if values.get("seed") is not None:
+                    # Seeds can be bigger than SQLite's 64 bit signed integers.
+                    values["seed"] = str(values["seed"])
+                cursor = self._connection.execute(
+                    "INSERT INTO runs ({}) VALUES ({})".format(", ".join(RUN_COLUMNS),
+                                                               ", ".join("?" * len(RUN_COLUMNS))),
+                    [values.get(name) for name in RUN_COLUMNS])
+                run_ids.append(cursor.lastrowid)
+                self._connection.executemany(
+                    "INSERT INTO steps (run_id, {}) VALUES (?, {})".format(
+                        ", ".join(STEP_COLUMNS), ", ".join("?" * len(STEP_COLUMNS))),
+                    [(cursor.lastrowid,) + tuple(counts) for counts in step_counts])
+        return run_ids
+
+    def add_results(self, rows):
+        return self.add_runs([(dict((name, row[name]) for name, _ in PARAMETER_COLUMNS),
+                               row["outcome"], row["step_counts"]) for row in rows])
+
+    def add_simulation(self, simulation, replicate=None):
+        parameters = dict((name, getattr(simulation, name, None)) for name, _ in PARAMETER_COLUMNS)
+        parameters["replicate"] = replicate
+        outcome = dict((name, getattr(simulation, name)) for name, _ in OUTCOME_COLUMNS)
+        return self.add_run(parameters, outcome, simulation.step_counts)
+
+    def runs(self, **conditions):
+        where = []
+        values = []
+        for name, condition in sorted(conditions.items()):
+            if name not in RUN_COLUMNS and name != "run_id":
+                raise ValueError("runs have no column " + repr(name))
+            if isinstance(condition, tuple):
+                low, high = condition
+                if low is not None:
+                    where.append(name + " >= ?")
+                    values.append(low)
+                if high is not None:
+                    where.append(name + " <= ?")
+                    values.append(high)
+            else:
+                where.append(name + " = ?")
+                values.append(condition)
+        query = "SELECT * FROM runs"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        return [dict(row) for row in self._connection.execute(query + " ORDER BY run_id", values)]
+
+    def steps(self, run_id):
+        return [dict(row) for row in self._connection.execute(
+            "SELECT {} FROM steps WHERE run_id = ? ORDER BY step".format(", ".join(STEP_COLUMNS)),
+            (run_id,))]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lists the runs in a results store that match "
+                                                 "every condition given.")
+    parser.add_argument("results_file")
+    parser.add_argument("--min", nargs=2, action="append", default=[], metavar=("COLUMN", "VALUE"))
+    parser.add_argument("--max", nargs=2, action="append", default=[], metavar=("COLUMN", "VALUE"))
+    parser.add_argument("--eq", nargs=2, action="append", default=[], metavar=("COLUMN", "VALUE"))
+    parser.add_argument("--steps", action="store_true", help="also print every run's time steps")
+    args = parser.parse_args()
+    conditions = {}
+    for name, value in args.min:
+        conditions[name] = (float(value), conditions.get(name, (None, None))[1])
+    for name, value in args.max:
+        conditions[name] = (conditions.get(name, (None, None))[0], float(value))
+    for name, value in args.eq:
+        conditions[name] = value
+    with ResultsStore(args.results_file) as store:
+        columns = ("run_id",) + RUN_COLUMNS
+        print("\t".join(columns))
+        for run in store.runs(**conditions):
+            print("\t".join(str(run[name]) for name in columns))
+            if args.steps:
+                for step in store.steps(run["run_id"]):
+                    print("\t" + "\t".join(str(step[name]) for name in STEP_COLUMNS))
@@ -0,0 +1,117 @@
+import math, random
+
+
+class InteractionSampler(object):
+    '''
+    Keeps an index of every person an infected person is allowed to interact with,
+    so the simulation can draw unique interaction targets without retrying.
+
+
+    _____Attributes______
+
+    pool: [Person].  Everybody currently eligible for an interaction, in no
+        particular order.
+
+    position: Dict.  Maps a person's _id to their index in pool, so people can be
+        removed without searching the list.
+
+    rng: random.Random or the random module.  Where the random draws come from.
+
+    _____Methods_____
+
+    __init__(self, people, rng=random):
+        - Expects people as an iterable of Person objects.  Only the living ones are
+            added to the pool.
+
+    add(self, person), remove(self, person):
+        - Add or remove a single person in constant time.  Removing is done by moving
+            the last person in the pool into the removed person's slot.
+
+    sample(self, count):
+        - Returns a list of count unique people picked uniformly at random from the pool,
+            or the whole pool in random order if it holds fewer than count people.
+        - Uses a partial Fisher-Yates shuffle of the pool, so it costs O(count) no
+            matter how big the population is, and never has to retry a draw.
+    '''
+
+    def __init__(self, people, rng=random):
+        self.rng = rng
+        self.pool = []
+        self.position = {}
+        for person in people:
+            if person.is_alive:
+                self.add(person)
+
+    def __len__(self):
+        return len(self.pool)
+
+    def __contains__(self, person):
+        return person._id in self.position
+
+    def add(self, person):
+        if person._id not in self.position:
+            self.position[person._id] = len(self.pool)
+            self.pool.append(person)
+
+    def remove(self, person):
+        index = self.position.pop(person._id, None)
+        if index is None:
+            return
+        last = self.pool.pop()
+        if index < len(self.pool):
+            self.pool[index] = last
+            self.position[last._id] = index
+
+    def sample(self, count):
+        """Swaps count randomly chosen people to the front of the pool and returns
+        them.  The pool stays a valid index, only its order changes."""
+        pool = self.pool
+        count = min(count, len(pool))
+        for i in range(count):
+            j = self.rng.randrange(i, len(pool))
+            pool[i], pool[j] = pool[j], pool[i]
+            self.position[pool[i]._id] = i
+            self.position[pool[j]._id] = j
+        return pool[:count]
+
+
+def hypergeometric(rng, population, successes, draws):
+    """Draws how many of `draws` people picked without replacement from
+    `population` people are among the `successes`.  Uses one rng.random() call,
+    inverting the distribution by walking up from the smallest possible count."""
+    failures = population - successes
+    k = max(0, draws - failures)
+    top = min(draws, successes)
+    if k == top:
+        return k
+    log_p = (_log_choose(successes, k) + _log_choose(failures, draws - k)
+             - _log_choose(population, draws))
+    p = math.exp(log_p)
+    u = rng.random()
+    while u >= p and k < top:
+        u -= p
+        p *= (successes - k) * (draws - k) / ((k + 1.0) * (failures - draws + k + 1))
+        k += 1
+    return k
+
+
+def binomial(rng, trials, probability):
+    """Draws the number of successes in `trials` tries, with one rng.random()
+    call."""
+    if trials == 0 or probability <= 0:
+        return 0
+    if probability >= 1:
+        return trials
+    odds = probability / (1.0 - probability)
+    p = (1.0 - probability) ** trials
+    u = rng.random()
+    k = 0
+    while u >= p and k < trials:
+        u -= p
+        p *= (trials - k) * odds / (k + 1.0)
+        k += 1
+    return k
+
+
+def _log_choose(n, k):
+    return math.lgamma(n + 1) - math.lgamma(k + 1) - math.lgamma(n - k + 1)
@@ -0,0 +1,216 @@
+import multiprocessing
+import numpy as np
+from population import Population
+from simulation import Simulation
+from logger import INFECTS, VACCINATED, LOG_RESOLUTIONS, LOG_INTERACTIONS
+
+
+class ShardedSimulation(Simulation):
+    '''
+    A Simulation of one population split across several worker processes.  Every
+    worker owns a contiguous slice of _ids and keeps them in its own Population,
+    so neither the memory nor the work of a time step has to fit in one process.
+
+    Each time step, this process decides how many of an infector's 100 contacts
+    fall in each shard.  The split is drawn from the hypergeometric distribution
+    over the shards' living counts, which is exactly how 100 unique people drawn
+    from the whole living population would fall.  Every shard then simulates the
+    contacts landing in it for all infectors at once with Population.interact,
+    and reports back who it infected.  A person is only ever drawn by the shard
+    that owns them, so the usual rules hold across shards: nobody is infected
+    twice, and deaths, survivals and new infections only take effect between
+    time steps, when every shard has answered.
+
+    Results are reproducible for a given seed and number of shards, and follow
+    the same distribution as the "array" engine, but are not the same draws.
+
+
+    _____Attributes______
+
+    Everything a Simulation has, except that population is None and the people
+    live in the workers instead.
+
+    shards: Int.  The number of worker processes.
+
+    bounds: [Int].  Shard k owns the _ids from bounds[k] up to bounds[k + 1].
+
+    shard_living: [Int].  The number of people still alive in each shard.
+
+    connections: [Connection].  One pipe to each worker.
+
+    rng: numpy Generator.  Splits contacts between the shards.
+
+    _____Methods_____
+
+    __init__(self, population_size, vacc_percentage, virus_name, mortality_rate,
+     basic_repro_num, initial_infected=1, shards=2, logger=None, seed=None,
+     verbosity=None):
+        - Starts the workers, which create their slice of the population in parallel.
+
+    run(self):
+        - Same as Simulation.run, without checkpoints.  Stops the workers when done.
+
+    close(self):
+        - Stops the workers.  Called by run, only needed if run never is.
+    '''
+
+    def __init__(self, population_size, vacc_percentage, virus_name, mortality_rate,
+                 basic_repro_num, initial_infected=1, shards=2, logger=None, seed=None,
+                 verbosity=None):
+        self.shards = max(1, min(shards, population_size))
+        self.connections = []
+        self.processes = []
+        Simulation.__init__(self, population_size, vacc_percentage, virus_name, mortality_rate,
+                            basic_repro_num, initial_infected, engine="sharded", logger=logger,
+                            seed=seed, verbosity=verbosity)
+
+    def _create_population(self):
+        """Starts one worker per shard and waits until each has created its
+        people.  Returns None, the population stays in the workers."""
+        self.bounds = [self.population_size * shard // self.shards for shard in range(self.shards + 1)]
+        self.rng = np.random.default_rng(self.random_streams["interaction"].getrandbits(64))
+        for shard in range(self.shards):
+            seeds = [self.random_streams[name].getrandbits(64)
+                     for name in ("population", "interaction", "survival")]
+            connection, worker_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=serve_shard,
+                args=(worker_connection, self.bounds[shard], self.bounds[shard + 1] - self.bounds[shard],
+                      self.vacc_percentage, self.mortality_rate, self.initial_infected,
+                      self.basic_repro_num, seeds))
+            process.daemon = True
+            process.start()
+            worker_connection.close()
+            self.connections.append(connection)
+            self.processes.append(process)
+        self.shard_living = []
+        for living, vaccinated in self._receive_all():
+            self.shard_living.append(living)
+            self.vaccinated += vaccinated
+        infected_count = min(self.initial_infected, self.population_size)
+        self.infected_people = np.arange(infected_count)
+        self.current_infected += infected_count
+        self.total_infected += infected_count
+        return None
+
+    def _receive_all(self):
+        """Waits for an answer from every worker, in shard order."""
+        answers = []
+        for connection in self.connections:
+            answer = connection.recv()
+            if isinstance(answer, Exception):
+                raise answer
+            answers.append(answer)
+        return answers
+
+    def _send_all(self, message):
+        for connection in self.connections:
+            connection.send(message)
+
+    def run(self, checkpoint_file=None, checkpoint_every=1):
+        if checkpoint_file:
+            raise ValueError("a sharded simulation cannot be checkpointed")
+        try:
+            return Simulation.run(self)
+        finally:
+            self.close()
+
+    def close(self):
+        for connection in self.connections:
+            try:
+                connection.send(("stop",))
+            except (OSError, EOFError):
+                pass
+            connection.close()
+        for process in self.processes:
+            process.join()
+        self.connections = []
+        self.processes = []
+
+    def time_step(self):
+        """Splits each infector's contacts between the shards, one shard at a
+        time, and lets every shard simulate its part of the step."""
+        log_interactions = self.verbosity >= LOG_INTERACTIONS
+        living = sum(self.shard_living)
+        remaining = np.full(len(self.infected_people), min(100, living), dtype=np.int64)
+        for connection, shard_living in zip(self.connections, self.shard_living):
+            living -= shard_living
+            quotas = self.rng.hypergeometric(shard_living, living, remaining) if living else remaining
+            remaining = remaining - quotas
+            connection.send(("interact", quotas.astype(np.uint8), log_interactions))
+        answers = self._receive_all()
+        self.newly_infected = np.concatenate([answer[0] for answer in answers])
+        self.saved += sum(answer[1] for answer in answers)
+        self.interactions += sum(answer[2] for answer in answers)
+        if log_interactions:
+            rows = np.concatenate([answer[3] for answer in answers])
+            order = np.argsort(rows, kind="stable")
+            targets = np.concatenate([answer[4] for answer in answers])[order]
+            outcomes = np.concatenate([answer[5] for answer in answers])[order]
+            self.logger.log_interactions(self.infected_people[rows[order]].tolist(),
+                                         targets.tolist(), outcomes.tolist())
+
+    def _resolve_infections(self):
+        log_resolutions = self.verbosity >= LOG_RESOLUTIONS
+        self._send_all(("resolve", log_resolutions))
+        answers = self._receive_all()
+        for shard, (living, survivors, died, _) in enumerate(answers):
+            self.shard_living[shard] = living
+            self.survived += survivors
+            self.vaccinated += survivors
+            self.died += died
+        self.current_infected -= len(self.infected_people)
+        if log_resolutions:
+            survived = np.concatenate([answer[3] for answer in answers])
+            self.logger.log_infection_survivals(self.infected_people.tolist(), survived.tolist())
+
+    def _infect_newly_infected(self):
+        """Every shard infects the people it infected this step.  Shards report
+        their new infections sorted, so together they are in _id order."""
+        self._send_all(("infect",))
+        self.infected_people = self.newly_infected
+        self.current_infected += len(self.newly_infected)
+        self.total_infected += len(self.newly_infected)
+        self.newly_infected = []
+
+
+def serve_shard(connection, start, size, vacc_percentage, mortality_rate, initial_infected,
+                basic_repro_num, seeds):
+    """Body of a worker process.  Holds the people from start to start + size as
+    a Population with local _ids, and answers the messages of a
+    ShardedSimulation until told to stop."""
+    try:
+        rngs = [np.random.default_rng(seed) for seed in seeds]
+        population = Population(size, vacc_percentage, mortality_rate,
+                                max(0, min(initial_infected - start, size)), rngs[1], rngs[2], rngs[0])
+        infectors = population.infectors()
+        newly_infected = infectors[:0]
+        connection.send((population.living, int(population.is_vaccinated.sum())))
+        while True:
+            message = connection.recv()
+            if message[0] == "interact":
+                quotas, log_interactions = message[1:]
+                # Rows stand in for the infectors, this shard only needs to know how
+                # many contacts each one has here.
+                rows = np.flatnonzero(quotas)
+                rows, targets, outcomes = population.interact(rows, basic_repro_num, quotas[rows].astype(np.int64))
+                newly_infected = np.sort(targets[outcomes == INFECTS])
+                answer = [newly_infected + start, int((outcomes == VACCINATED).sum()), len(targets)]
+                if log_interactions:
+                    answer += [rows, targets + start, outcomes]
+                connection.send(answer)
+            elif message[0] == "resolve":
+                survived = population.resolve_infections(infectors)
+                survivors = int(survived.sum())
+                connection.send((population.living, survivors, len(infectors) - survivors,
+                                 survived if message[1] else None))
+            elif message[0] == "infect":
+                population.infect(newly_infected, mortality_rate)
+                infectors = newly_infected
+                newly_infected = infectors[:0]
+            else:
+                break
+    except Exception as error:
+        connection.send(error)
+    finally:
+        connection.close()
@@ -1,7 +1,17 @@
-import random, sys
+import argparse, random
+import checkpoint
 random.seed(42)
+try:
+    import numpy as np
+except ImportError:
+    np = None
 from person import Person
-from logger import Logger
+from logger import Logger, BinaryLogger, AsyncLogger, INFECTS, VACCINATED, VERBOSITY_LEVELS
+from logger import LOG_STEPS, LOG_RESOLUTIONS, LOG_INTERACTIONS
+from sampler import InteractionSampler, hypergeometric, binomial
+from metrics import Metrics, NullMetrics
+
+RANDOM_STREAMS = ("population", "interaction", "survival")
 
 class Simulation(object):
     '''
@@ -15,12 +25,51 @@ class Simulation(object):
     _____Attributes______
 
     logger: Logger object.  The helper object that will be responsible for writing
-    all logs to the simulation.
+    all logs to the simulation.  Defaults to an unbuffered Logger writing to "log1",
+    a different one can be passed in with the logger argument.
+
+    verbosity: Int.  The verbosity of the logger (see logger.py).  Records above it are
+        never built: no log calls, no id lists and no strings.
 
     population_size: Int.  The size of the population for this simulation.
 
     population: [Person].  A list of person objects representing all people in
-        the population.
+        the population.  With the "array" engine this is a population.Population.
+
+    seed: Int.  The seed every random stream of this simulation was derived from.
+
+    random_streams: Dict of random.Random.  One independent stream for each of
+        RANDOM_STREAMS: creating the population, interactions (picking targets and
+        infection draws) and survival draws.  Nothing in a simulation touches the
+        global random module, so simulations running side by side in threads or
+        processes give the same results as they would alone.
+
+    sampler: InteractionSampler.  Index of everybody that is alive and not newly
+        infected, used by the list engine to draw interaction targets.
+
+    engine: String.  "list" simulates one Person object at a time, "array" simulates
+        whole time steps with batched NumPy operations.  Both follow the same rules
+        and write the same log lines.
+
+    aggregate: Bool.  When True and interactions are not logged, a time step only
+        draws how many of each infected person's contacts are susceptible or
+        vaccinated and how many of them get infected, then picks just the people
+        infected.  Same distribution of results, far fewer random draws.
+
+    susceptible: InteractionSampler or None.  Index of the people that can still
+        be infected, built by the first aggregated time step of the list engine.
+
+    population_file: String or None.  A population saved with save_population to
+        load instead of generating a new one.
+
+    network: network.ContactNetwork or None.  With a network, infected people only
+        interact with their living neighbours in it (up to 100 of them, picked at
+        random) instead of with anybody in the population.
+
+    spatial: Dict or None.  With the "array" engine, keyword arguments for a
+        spatial.StructuredPopulation to create instead of a Population: people
+        live in households on a grid of cells, and most of their contacts are
+        drawn from their household and the cells around them.
 
     next_person_id: Int.  The next available id value for all created person objects.
         Each person should have a unique _id value.
@@ -46,14 +95,50 @@ class Simulation(object):
     total_dead: Int.  The number of people that have died as a result of the infection
         during this simulation.  Starts at zero.
 
+    infected_people: [Person], or an array of ids with the "array" engine.  Everybody
+        currently infected, in _id order.  Kept up to date as people are infected and
+        resolved, so a time step only has to look at these people instead of the
+        whole population.
+
+    time_steps: Int.  How many time steps run() has finished.  Once the run is over,
+        how many it took before the virus burned out.
+
+    died, survived, vaccinated, saved: Int.  Running counts of deaths, survivors,
+        vaccinated people (including survivors) and interactions where a vaccination
+        stopped an infection.  These are what master_stats is logged from.
+
+    interactions: Int.  Running count of interactions simulated.
+
+    step_counts: [tuple].  The counters at the end of every time step, in the order
+        of results.STEP_COLUMNS, for storing the run in a results.ResultsStore.
+
+    metrics: metrics.Metrics or None.  Times the phases of every time step and
+        reports them with the step's counters.  None costs nothing measurable.
+
 
     _____Methods_____
 
     __init__(population_size, vacc_percentage, virus_name, mortality_rate,
-     basic_repro_num, initial_infected=1):
+     basic_repro_num, initial_infected=1, engine="list", logger=None, seed=None,
+     verbosity=None, network=None, aggregate=False, metrics=None, population_file=None,
+     spatial=None):
         -- All arguments will be passed as command-line arguments when the file is run.
+        -- seed can be an Int, a random.Random or a numpy Generator.  If left as None,
+            one is drawn from the random module, which is seeded with 42 at import.
         -- After setting values for attributes, calls self._create_population() in order
             to create the population array that will be used for this simulation.
+        -- With population_file, the population is loaded from that file instead and
+            population_size and vacc_percentage are only used for the logs.  Needs NumPy.
+
+    steps(self, checkpoint_file=None, checkpoint_every=1):
+        -- Runs the simulation like run(), as a generator that yields a small dict
+            of counts after every time step, for watching, plotting or stopping a
+            run while it goes without reading the logfile.
+
+    save_population(self, file_name):
+        -- Writes who is vaccinated to a .npy file that can be passed back as
+            population_file, so repeated runs skip generating the population.  Call
+            it before run().
 
     _create_population(self, initial_infected):
         -- Expects initial_infected as an Int.
@@ -67,10 +152,28 @@ class Simulation(object):
             self.vacc_percentage, new person object will be created with is_vaccinated
             set to True.  Otherwise, is_vaccinated will be set to False.
         -- Once len(population) is the same as self.population_size, returns population.
+        -- The whole population is built by list comprehensions instead of one append
+            at a time, drawing from the population stream in the same order.
+        -- With the "array" engine, returns a Population that stores the same data in
+            NumPy arrays instead of a list of Person objects.
     '''
 
     def __init__(self, population_size, vacc_percentage, virus_name,
-                 mortality_rate, basic_repro_num, initial_infected=1):
+                 mortality_rate, basic_repro_num, initial_infected=1, engine="list",
+                 logger=None, seed=None, verbosity=None, network=None, aggregate=False,
+                 metrics=None, population_file=None, spatial=None):
+        if spatial is not None and (engine != "array" or population_file is not None):
+            raise ValueError("a spatial population needs the array engine and cannot be loaded from a file")
+        self.engine = engine
+        self.spatial = spatial
+        self.population_file = population_file
+        self.metrics = metrics
+        self.network = network
+        self.aggregate = aggregate
+        self.susceptible = None
+        self.seed = self._seed_from(seed)
+        self.random_streams = dict((name, random.Random("{}:{}".format(self.seed, name)))
+                                   for name in RANDOM_STREAMS)
         self.population_size = population_size
         self.population = []
         self.total_infected = 0
@@ -79,6 +182,11 @@ class Simulation(object):
         self.survived = 0
         self.uninfected = 0
         self.vaccinated = 0
+        self.saved = 0
+        self.interactions = 0
+        self.step_counts = []
+        self.time_steps = 0
+        self.infected_people = []
         self.virus_name = virus_name
         self.mortality_rate = mortality_rate
         self.basic_repro_num = basic_repro_num
@@ -86,31 +194,88 @@ class Simulation(object):
             virus_name, population_size, vacc_percentage, initial_infected)
         self.initial_infected = initial_infected
         self.vacc_percentage = vacc_percentage
-        self.logger = Logger("log1")
+        if logger is None:
+            logger = Logger("log1")
+        self.logger = logger
+        if verbosity is not None:
+            logger.verbosity = verbosity
         self.newly_infected = []
         self.population = self._create_population()
+        if self.engine == "list":
+            self.sampler = InteractionSampler(self.population, self.random_streams["interaction"])
+
+    @property
+    def verbosity(self):
+        return self.logger.verbosity
+
+    def _seed_from(self, seed):
+        """Turns the seed argument into an Int the random streams are derived from."""
+        if seed is None:
+            return random.getrandbits(64)
+        if isinstance(seed, random.Random):
+            return seed.getrandbits(64)
+        if hasattr(seed, "integers"):
+            return int(seed.integers(0, 2 ** 63))
+        return int(seed)
 
     def _create_population(self):
         """Creates and returns a population of Person objects with the correct
         number of infected and vaccinated persons."""
-        population = []
-        popCounter = 0
-        infected_count = 0
-        while len(population) != self.population_size:
-            if infected_count !=  self.initial_infected:
-                population.append(Person(popCounter, False, self.mortality_rate))
-                infected_count += 1
-                self.current_infected += 1
-                self.total_infected += 1
-            else:
-                if random.uniform(0,1) < self.vacc_percentage:
-                    population.append(Person(popCounter, True, None))
-                    self.vaccinated +=1
-                else:
-                    population.append(Person(popCounter, False, None))
-            popCounter += 1
+        if self.engine == "array":
+            return self._create_array_population()
+        if self.population_file is not None:
+            vaccinations = np.load(self.population_file, mmap_mode="r").tolist()
+            self.population_size = len(vaccinations)
+        else:
+            # uniform(0, 1) is random() scaled by 1, so these are the same draws.
+            draw = self.random_streams["population"].random
+            vaccinations = [draw() < self.vacc_percentage
+                            for _ in range(self.population_size - self.initial_infected)]
+            vaccinations[:0] = [False] * min(self.initial_infected, self.population_size)
+        infected_count = min(self.initial_infected, self.population_size)
+        population = [Person(_id, False, self.mortality_rate) for _id in range(infected_count)]
+        population.extend([Person(_id, vaccinations[_id], None)
+                           for _id in range(infected_count, self.population_size)])
+        self.infected_people = population[:infected_count]
+        self.current_infected += infected_count
+        self.total_infected += infected_count
+        self.vaccinated += sum(vaccinations[infected_count:])
+        return population
+
+    def _create_array_population(self):
+        """Creates the Population used by the array engine.  Its NumPy generators
+        are seeded from the matching random streams."""
+        from population import Population
+        rngs = dict((name, np.random.default_rng(stream.getrandbits(64)))
+                    for name, stream in self.random_streams.items())
+        if self.spatial is not None:
+            from spatial import StructuredPopulation
+            population = StructuredPopulation(self.population_size, self.vacc_percentage,
+                                              self.mortality_rate, self.initial_infected,
+                                              rngs["interaction"], rngs["survival"], rngs["population"],
+                                              **self.spatial)
+        elif self.population_file is not None:
+            population = Population.load(self.population_file, self.mortality_rate,
+                                         self.initial_infected, rngs["interaction"], rngs["survival"])
+            self.population_size = len(population)
+        else:
+            population = Population(self.population_size, self.vacc_percentage,
+                                    self.mortality_rate, self.initial_infected, rngs["interaction"],
+                                    rngs["survival"], rngs["population"])
+        infected_count = min(self.initial_infected, self.population_size)
+        self.infected_people = np.arange(infected_count)
+        self.current_infected += infected_count
+        self.total_infected += infected_count
+        self.vaccinated += int(population.is_vaccinated.sum())
         return population
 
+    def save_population(self, file_name):
+        """Writes who is vaccinated to file_name, see Population.save."""
+        if self.engine == "array":
+            self.population.save(file_name)
+        else:
+            np.save(file_name, np.array([person.is_vaccinated for person in self.population]))
+
     def _simulation_should_continue(self):
         """Determines whether the simulation should continue based on if there
         are any newly-infected people."""
@@ -119,55 +284,197 @@ class Simulation(object):
         else:
             return True
 
-    def run(self):
+    def run(self, checkpoint_file=None, checkpoint_every=1):
         """Runs the simulation while should_continue is true. Logs the start
         meta data, the time_step, and masters stats. After the time_step(),
         did_survive_infection Person class method is run on infected to determine
-        if they lived or died."""
-        self.logger.write_metadata(self.population_size, self.vacc_percentage, self.virus_name, self.mortality_rate, self.basic_repro_num)
-        time_step_counter = 0
-        should_continue = True
-        while should_continue:
-            self.time_step()
-            self.logger.master_stats(self.died, self.survived, self.vaccinated, self.total_infected, len(self.newly_infected), (len(self.population) - self.died))
-            self.logger.log_time_step(time_step_counter)
-            time_step_counter += 1
-            for person in self.population:
-                if person.infected != None:
-                    if person.did_survive_infection():
-                        self.survived += 1
-                        self.vaccinated += 1
-                        self.logger.log_survivor(person)
-                    else:
-                        self.died += 1
-                        self.logger.log_death(person)
-                    self.current_infected -= 1
-            should_continue = self._simulation_should_continue()
-            self._infect_newly_infected()
-        print("The simulation has ended after " + str(time_step_counter) + " turns.")
-        self.logger.master_stats(self.died, self.survived, self.vaccinated, self.total_infected, len(self.newly_infected), (len(self.population) - self.died))
+        if they lived or died.  The logger is closed when the run ends.  Returns
+        the number of time steps the simulation took.
+
+        With a checkpoint_file, a snapshot is saved there every checkpoint_every
+        time steps.  A simulation loaded with checkpoint.load continues from
+        self.time_steps instead of starting a new log.
+
+        With self.metrics set, every time step is timed phase by phase, see
+        metrics.Metrics.
+
+        Simply runs steps() to the end."""
+        for _ in self.steps(checkpoint_file, checkpoint_every):
+            pass
+        return self.time_steps
+
+    def steps(self, checkpoint_file=None, checkpoint_every=1):
+        """Generator doing the work of run(), that yields a summary of every time
+        step as soon as it is done, see _step_summary.  Stopping early (breaking
+        out of the loop or calling close()) closes the logger without logging the
+        final master_stats."""
+        metrics = self.metrics or NullMetrics()
+        with self.logger:
+            metrics.attach(self)
+            try:
+                if self.time_steps == 0:
+                    self.logger.write_metadata(self.population_size, self.vacc_percentage, self.virus_name, self.mortality_rate, self.basic_repro_num)
+                should_continue = True
+                while should_continue:
+                    before = (self.died, self.survived, self.saved)
+                    metrics.start_step()
+                    self.time_step()
+                    metrics.lap("time_step")
+                    if self.verbosity >= LOG_STEPS:
+                        self._log_master_stats()
+                    self.logger.log_time_step(self.time_steps)
+                    self.time_steps += 1
+                    metrics.lap("logging")
+                    self._resolve_infections()
+                    metrics.lap("resolve")
+                    should_continue = self._simulation_should_continue()
+                    self._infect_newly_infected()
+                    self._record_step()
+                    metrics.lap("infect")
+                    if should_continue and checkpoint_file and self.time_steps % checkpoint_every == 0:
+                        checkpoint.save(self, checkpoint_file)
+                    metrics.lap("checkpoint")
+                    metrics.end_step()
+                    yield self._step_summary(*before)
+                print("The simulation has ended after " + str(self.time_steps) + " turns.")
+                self._log_master_stats()
+            finally:
+                metrics.detach(self)
+
+    def _step_summary(self, died, survived, saved):
+        """What steps() yields for the time step just finished, given the counters
+        from before it: a dict of the step's number and its newly_infected, died,
+        survived and saved counts, and how many people are living after it."""
+        return {"step": self.time_steps - 1,
+                "newly_infected": len(self.infected_people),
+                "died": self.died - died,
+                "survived": self.survived - survived,
+                "saved": self.saved - saved,
+                "living": self.population_size - self.died}
+
+    def _record_step(self):
+        self.step_counts.append((self.time_steps - 1, len(self.infected_people), self.current_infected,
+                                 self.total_infected, self.died, self.survived, self.vaccinated,
+                                 self.saved, self.interactions))
+
+    def _log_master_stats(self):
+        self.logger.master_stats(self.died, self.survived, self.vaccinated, self.total_infected, len(self.newly_infected), (self.population_size - self.died), self.saved)
+
+    def _resolve_infections(self):
+        """Runs did_survive_infection on everybody infected, counting and logging
+        who survived and who died."""
+        if self.engine == "array":
+            infectors = self.infected_people
+            survived = self.population.resolve_infections(infectors)
+            survivors = int(survived.sum())
+            self.survived += survivors
+            self.vaccinated += survivors
+            self.died += len(infectors) - survivors
+            self.current_infected -= len(infectors)
+            if self.verbosity >= LOG_RESOLUTIONS:
+                self.logger.log_infection_survivals(infectors.tolist(), survived.tolist())
+            return
+        log_resolutions = self.verbosity >= LOG_RESOLUTIONS
+        for person in self.infected_people:
+            if person.did_survive_infection(self.random_streams["survival"]):
+                self.survived += 1
+                self.vaccinated += 1
+                if log_resolutions:
+                    self.logger.log_survivor(person)
+            else:
+                self.died += 1
+                self.sampler.remove(person)
+                if log_resolutions:
+                    self.logger.log_death(person)
+            self.current_infected -= 1
 
     def time_step(self):
         """For each person in the population that is infected, have them interact
-        with 100 unique individuals that are alive and not in self.newly_infected."""
-        for i, person in enumerate(self.population):
-            if person.infected != None:
-                interactions = 0
-                peopleInteractedWith = []
-                while interactions < 100:
-                    target = self.population[random.randint(0, len(self.population)-1)]
-                    if target not in peopleInteractedWith and target.is_alive and target not in self.newly_infected:
-                        did_infect = self.interaction(self.population[i], target)
-                        self.logger.log_interaction(self.population[i], target, did_infect, target.is_vaccinated, target.infected)
-                        interactions += 1
-                        peopleInteractedWith.append(target)
+        with 100 unique individuals that are alive and not in self.newly_infected.
+        Targets come from self.sampler, which newly infected people are removed
+        from as soon as they are infected.  If fewer than 100 people are eligible,
+        the infected person interacts with all of them.  With a network, the 100
+        are drawn from the infected person's neighbours instead."""
+        if (self.aggregate and self.network is None and self.spatial is None
+                and self.verbosity < LOG_INTERACTIONS):
+            self._time_step_counts()
+            return
+        if self.engine == "array":
+            if self.network is not None:
+                infectors, targets, outcomes = self.population.interact_network(
+                    self.infected_people, self.network, self.basic_repro_num)
+            else:
+                infectors, targets, outcomes = self.population.interact(
+                    self.infected_people, self.basic_repro_num)
+            self.newly_infected = targets[outcomes == INFECTS]
+            self.saved += int((outcomes == VACCINATED).sum())
+            self.interactions += len(targets)
+            if self.verbosity >= LOG_INTERACTIONS:
+                self.logger.log_interactions(infectors.tolist(), targets.tolist(), outcomes.tolist())
+            return
+        log_interactions = self.verbosity >= LOG_INTERACTIONS
+        for person in self.infected_people:
+            if self.network is not None:
+                targets = self._network_targets(person, 100)
+            else:
+                targets = self.sampler.sample(100)
+            self.interactions += len(targets)
+            for target in targets:
+                did_infect = self.interaction(person, target)
+                if log_interactions:
+                    self.logger.log_interaction(person, target, did_infect, target.is_vaccinated, target.infected)
+                if did_infect:
+                    self.sampler.remove(target)
+                elif target.is_vaccinated:
+                    self.saved += 1
+
+    def _time_step_counts(self):
+        """Fast path of time_step for when interactions are not logged.  The 100
+        people an infected person meets are unique people from self.sampler, so
+        how many of them are vaccinated or susceptible can be drawn straight from
+        hypergeometric distributions, and how many get infected from a binomial
+        one.  Only those are then picked, from self.susceptible."""
+        if self.engine == "array":
+            self.newly_infected, saved, contacts = self.population.interact_counts(
+                self.infected_people, self.basic_repro_num)
+            self.saved += saved
+            self.interactions += contacts
+            return
+        rng = self.random_streams["interaction"]
+        if self.susceptible is None:
+            self.susceptible = InteractionSampler(
+                [person for person in self.sampler.pool
+                 if not person.is_vaccinated and person.infected is None], rng)
+        for person in self.infected_people:
+            eligible = len(self.sampler)
+            count = min(100, eligible)
+            susceptible = len(self.susceptible)
+            vaccinated = eligible - susceptible - len(self.infected_people)
+            hit_vaccinated = hypergeometric(rng, eligible, vaccinated, count)
+            hit_susceptible = hypergeometric(rng, eligible - vaccinated, susceptible,
+                                             count - hit_vaccinated)
+            self.saved += hit_vaccinated
+            self.interactions += count
+            for target in self.susceptible.sample(binomial(rng, hit_susceptible, self.basic_repro_num)):
+                self.newly_infected.append(target)
+                self.sampler.remove(target)
+                self.susceptible.remove(target)
+
+    def _network_targets(self, person, count):
+        """Picks up to count of person's neighbours that are alive and not newly
+        infected."""
+        targets = [self.population[_id] for _id in self.network.neighbours_of(person._id).tolist()]
+        targets = [target for target in targets if target in self.sampler]
+        if len(targets) > count:
+            targets = self.random_streams["interaction"].sample(targets, count)
+        return targets
 
     def interaction(self, person, random_person):
         """During the interaction get a random float between 0 and 1. If the
         float is less than the reproductive rate of the virus, infect the person
         and return True otherwise return False."""
         if random_person.is_vaccinated == False and random_person.infected == None:
-            sick = random.uniform(0,1)
+            sick = self.random_streams["interaction"].uniform(0,1)
             if sick < self.basic_repro_num:
                 self.newly_infected.append(random_person)
                 return True
@@ -179,24 +486,131 @@ class Simulation(object):
     def _infect_newly_infected(self):
         """For individuals in self.newly_infected, change their infected variable
         to the virus' mortality_rate. Add 1 to both the total infected and current
-        infected, and then empty the array self.newly_infected."""
+        infected, and then empty the array self.newly_infected.  The newly
+        infected become the infected_people of the next time step."""
+        if self.engine == "array":
+            self.infected_people = np.sort(self.newly_infected)
+            self.population.infect(self.newly_infected, self.mortality_rate)
+            self.current_infected += len(self.newly_infected)
+            self.total_infected += len(self.newly_infected)
+            self.newly_infected = []
+            return
+        self.infected_people = sorted(self.newly_infected, key=lambda sickie: sickie._id)
         for sickie in self.newly_infected:
             sickie.infected = self.mortality_rate
+            self.sampler.add(sickie)
+            if self.susceptible is not None:
+                self.susceptible.remove(sickie)
             self.current_infected += 1
             self.total_infected += 1
         self.newly_infected = []
 
 if __name__ == "__main__":
-    params = sys.argv[1:]
-    pop_size = int(params[0])
-    vacc_percentage = float(params[1])
-    virus_name = str(params[2])
-    mortality_rate = float(params[3])
-    basic_repro_num = float(params[4])
-    if len(params) == 6:
-        initial_infected = int(params[5])
+    parser = argparse.ArgumentParser(description="Simulates the spread of a virus through a population.")
+    parser.add_argument("pop_size", type=int, nargs="?")
+    parser.add_argument("vacc_percentage", type=float, nargs="?")
+    parser.add_argument("virus_name", nargs="?")
+    parser.add_argument("mortality_rate", type=float, nargs="?")
+    parser.add_argument("basic_repro_num", type=float, nargs="?")
+    parser.add_argument("initial_infected", type=int, nargs="?", default=1)
+    parser.add_argument("--engine", choices=["list", "array"], default="list",
+                        help="'array' simulates with NumPy arrays, much faster for big populations")
+    parser.add_argument("--shards", type=int, default=1, metavar="N",
+                        help="split the population across N worker processes (array rules, needs NumPy)")
+    parser.add_argument("--log-buffer", type=int, default=None, metavar="LINES",
+                        help="keep the logfile open and write it in batches of LINES lines")
+    parser.add_argument("--log-format", choices=["text", "binary"], default="text",
+                        help="'binary' writes a compact event log to log1.bin, "
+                             "convert it with python3 logger.py log1.bin log1")
+    parser.add_argument("--verbosity", choices=sorted(VERBOSITY_LEVELS, key=VERBOSITY_LEVELS.get),
+                        default="interactions",
+                        help="how much to log: only the final summary, every time step's "
+                             "summary, also deaths and survivals, or also every interaction")
+    parser.add_argument("--aggregate", action="store_true",
+                        help="when interactions are not logged, draw how many contacts infect "
+                             "instead of simulating every contact")
+    parser.add_argument("--metrics", default=None, metavar="FILE",
+                        help="append timings and counters of every time step to FILE as JSON lines")
+    parser.add_argument("--results", default=None, metavar="FILE",
+                        help="add this run and its per time step counts to the results store FILE")
+    parser.add_argument("--async-log", action="store_true",
+                        help="format and write the log on a background thread")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="seed for this simulation's random streams")
+    parser.add_argument("--checkpoint", default=None, metavar="FILE",
+                        help="save a snapshot of the simulation to FILE as it runs")
+    parser.add_argument("--checkpoint-every", type=int, default=5, metavar="STEPS",
+                        help="how many time steps apart snapshots are saved")
+    parser.add_argument("--population", default=None, metavar="FILE",
+                        help="load the population from FILE instead of generating it (needs NumPy)")
+    parser.add_argument("--save-population", default=None, metavar="FILE",
+                        help="save the generated population to FILE (a .npy file) for later runs")
+    parser.add_argument("--network", choices=["regular", "small-world", "scale-free"], default=None,
+                        help="only let people interact with their neighbours in a generated contact network")
+    parser.add_argument("--edge-list", default=None, metavar="FILE",
+                        help="load the contact network from FILE, one 'source target' pair per line, or a .npy array")
+    parser.add_argument("--degree", type=int, default=20, help="mean number of neighbours in a generated network")
+    parser.add_argument("--rewire", type=float, default=0.1,
+                        help="chance that a small-world link is moved to a random person")
+    parser.add_argument("--households", type=float, default=None, metavar="SIZE",
+                        help="with the array engine, put people in households of SIZE people on "
+                             "average, on a grid of cells, and draw most contacts close to home")
+    parser.add_argument("--cell-people", type=int, default=1000,
+                        help="average number of people in a grid cell")
+    parser.add_argument("--household-share", type=float, default=0.05,
+                        help="chance that a contact is with somebody from the same household")
+    parser.add_argument("--local-share", type=float, default=0.8,
+                        help="chance that a contact is with somebody in the same or a neighbouring cell")
+    parser.add_argument("--resume", default=None, metavar="FILE",
+                        help="continue the simulation saved in FILE, the simulation "
+                             "arguments and the verbosity are then taken from the snapshot")
+    args = parser.parse_args()
+    if args.resume is None and args.basic_repro_num is None:
+        parser.error("the simulation arguments are required unless --resume is used")
+    if args.shards > 1 and (args.network or args.edge_list or args.checkpoint or args.resume
+                            or args.population):
+        parser.error("--shards cannot be combined with a contact network, checkpoints or --population")
+    if args.households is not None and (args.engine != "array" or args.shards > 1 or args.population
+                                        or args.checkpoint or args.resume):
+        parser.error("--households needs --engine array and cannot be combined with --shards, "
+                     "--population or checkpoints")
+    spatial = None
+    if args.households is not None:
+        spatial = {"household_size": args.households, "cell_people": args.cell_people,
+                   "household_share": args.household_share, "local_share": args.local_share}
+    if args.log_format == "binary":
+        logger = BinaryLogger("log1.bin", args.log_buffer, VERBOSITY_LEVELS[args.verbosity])
+    else:
+        logger = Logger("log1", args.log_buffer, VERBOSITY_LEVELS[args.verbosity])
+    if args.async_log:
+        logger = AsyncLogger(logger)
+    if args.resume:
+        simulation = checkpoint.load(args.resume, logger)
+    elif args.shards > 1:
+        from sharded import ShardedSimulation
+        simulation = ShardedSimulation(args.pop_size, args.vacc_percentage, args.virus_name,
+                                       args.mortality_rate, args.basic_repro_num, args.initial_infected,
+                                       shards=args.shards, logger=logger, seed=args.seed)
     else:
-        initial_infected = 1
-    simulation = Simulation(pop_size, vacc_percentage, virus_name, mortality_rate,
-                            basic_repro_num, initial_infected)
-    simulation.run()
+        simulation = Simulation(args.pop_size, args.vacc_percentage, args.virus_name,
+                                args.mortality_rate, args.basic_repro_num, args.initial_infected,
+                                engine=args.engine, logger=logger, seed=args.seed,
+                                aggregate=args.aggregate, population_file=args.population,
+                                spatial=spatial)
+        if args.save_population:
+            simulation.save_population(args.save_population)
+    if args.edge_list:
+        import network
+        simulation.network = network.load_edge_list(args.edge_list, simulation.population_size)
+    elif args.network:
+        # Generated from the simulation's seed, so a resumed run gets the same network back.
+        import network
+        simulation.network = network.generate(args.network, simulation.population_size, args.degree,
+                                              np.random.default_rng(simulation.seed), args.rewire)
+    if args.metrics:
+        simulation.metrics = Metrics(args.metrics)
+    simulation.run(args.checkpoint or args.resume, args.checkpoint_every)
+    if args.results:
+        from results import ResultsStore
+        with ResultsStore(args.results) as store:
+            store.add_simulation(simulation)
@@ -0,0 +1,312 @@
+import argparse
+import numpy as np
+from population import Population, HEALTHY, INFECTED, DEAD
+from simulation import Simulation
+from logger import Logger, BinaryLogger, INFECTS, VACCINATED, VERBOSITY_LEVELS
+from logger import LOG_RESOLUTIONS, LOG_INTERACTIONS
+
+# Immunity is one bit per strain in a uint8.
+MAX_STRAINS = 8
+NO_STRAIN = -1
+
+
+class Strain(object):
+    '''
+    One of the viruses of a MultiStrainSimulation.
+
+
+    _____Attributes______
+
+    name: String.  The name of the strain, used in the logs.
+
+    mortality_rate: Float between 0 and 1.  Same meaning as Simulation.mortality_rate.
+
+    basic_repro_num: Float between 0 and 1.  Same meaning as Simulation.basic_repro_num.
+
+    initial_infected: Int.  How many people carry this strain when the simulation starts.
+    '''
+
+    def __init__(self, name, mortality_rate, basic_repro_num, initial_infected=1):
+        self.name = name
+        self.mortality_rate = mortality_rate
+        self.basic_repro_num = basic_repro_num
+        self.initial_infected = initial_infected
+
+
+class MultiStrainPopulation(Population):
+    '''
+    A Population where several strains spread at the same time.  Every person
+    carries at most one strain at a time, and surviving a strain leaves them
+    immune to it and, through cross_immunity, partly immune to the others.
+    Surviving is no longer the same as being vaccinated, so is_vaccinated only
+    holds the people vaccinated from the start, who are immune to every strain.
+
+    Interactions are simulated for the infectors of every strain together by
+    Population.interact and interact_network; only the chance that each one
+    infects depends on the strains involved.
+
+
+    _____Attributes______
+
+    Everything a Population has, plus:
+
+    strains: [Strain].  At most MAX_STRAINS of them.
+
+    strain: int8 array.  The number of the strain each person is infected with,
+        NO_STRAIN when they are not infected.
+
+    immunity: uint8 array.  Bit s is set for everybody who survived strain s.
+
+    repro_nums, mortality_rates: float64 arrays.  The values of every strain.
+
+    susceptibility: float64 array of shape (2 ** len(strains), len(strains)).  For
+        every combination of immunity bits, how much of a strain's basic_repro_num
+        still applies.  Built from cross_immunity, where cross_immunity[s][t] is how
+        much surviving strain s protects against strain t.  Without cross_immunity,
+        surviving a strain fully protects against it and not at all against the
+        others.
+
+    _____Methods_____
+
+    __init__(self, size, vacc_percentage, strains, rng, survival_rng=None,
+        population_rng=None, cross_immunity=None):
+        - The first strains[0].initial_infected people carry the first strain, the
+            next ones the second strain and so on.
+
+    resolve_infections(self, infectors):
+        - Same as Population.resolve_infections, except that survivors become immune
+            to their strain instead of vaccinated.
+
+    infect(self, ids, strains):
+        - Marks the people in ids as infected, each with the strain of the same index
+            in strains.
+    '''
+
+    def __init__(self, size, vacc_percentage, strains, rng, survival_rng=None,
+                 population_rng=None, cross_immunity=None):
+        if not 0 < len(strains) <= MAX_STRAINS:
+            raise ValueError("a population holds between 1 and {} strains".format(MAX_STRAINS))
+        counts = [strain.initial_infected for strain in strains]
+        Population.__init__(self, size, vacc_percentage, 0.0, sum(counts), rng, survival_rng,
+                            population_rng)
+        self.strains = list(strains)
+        self.repro_nums = np.array([strain.basic_repro_num for strain in strains], dtype=np.float64)
+        self.mortality_rates = np.array([strain.mortality_rate for strain in strains], dtype=np.float64)
+        self.strain = np.full(self.size, NO_STRAIN, dtype=np.int8)
+        initial = np.repeat(np.arange(len(strains), dtype=np.int8), counts)[:self.size]
+        self.strain[:len(initial)] = initial
+        self.infection_rate[:len(initial)] = self.mortality_rates[initial]
+        self.immunity = np.zeros(self.size, dtype=np.uint8)
+        self.susceptibility = susceptibility_table(len(strains), cross_immunity)
+
+    def _hit(self, infectors, rows, targets, rolls, basic_repro_num):
+        """basic_repro_num is ignored, every interaction uses the strain of its
+        infector, scaled down by the target's immunity to that strain."""
+        strains = self.strain[infectors[rows]]
+        chance = self.repro_nums[strains] * self.susceptibility[self.immunity[targets], strains]
+        return (rolls < chance) & self._susceptible(targets)
+
+    def resolve_infections(self, infectors):
+        survived = self.survival_rng.random(len(infectors)) >= self.infection_rate[infectors]
+        survivors = infectors[survived]
+        dead = infectors[~survived]
+        self.immunity[survivors] |= (1 << self.strain[survivors].astype(np.uint8)).astype(np.uint8)
+        self.state[survivors] = HEALTHY
+        self.state[dead] = DEAD
+        self.is_alive[dead] = False
+        self.living -= len(dead)
+        self.infection_rate[infectors] = 0
+        self.strain[infectors] = NO_STRAIN
+        return survived
+
+    def infect(self, ids, strains):
+        self.state[ids] = INFECTED
+        self.strain[ids] = strains
+        self.infection_rate[ids] = self.mortality_rates[strains]
+
+
+def susceptibility_table(count, cross_immunity=None):
+    """Returns the susceptibility table of MultiStrainPopulation: protection from
+    every strain survived multiplies together, so row `mask`, column t is the
+    product of 1 - cross_immunity[s][t] over the bits s set in mask."""
+    if cross_immunity is None:
+        cross_immunity = np.eye(count)
+    cross_immunity = np.asarray(cross_immunity, dtype=np.float64)
+    if cross_immunity.shape != (count, count):
+        raise ValueError("cross_immunity needs one row and one column per strain")
+    table = np.ones((2 ** count, count), dtype=np.float64)
+    for strain in range(count):
+        has_strain = (np.arange(2 ** count) >> strain) & 1 == 1
+        table[has_strain] *= 1.0 - cross_immunity[strain]
+    return table
+
+
+class MultiStrainSimulation(Simulation):
+    '''
+    A Simulation of several strains spreading through one population at the same
+    time, with the rules of the "array" engine.  The population is created and
+    stored once for all strains, see MultiStrainPopulation, and every time step
+    simulates the interactions of all strains in one batch.
+
+    The counters of Simulation hold the totals over every strain.  virus_name,
+    mortality_rate and basic_repro_num hold the values of every strain joined by
+    "/", which is how they show up in the logfile.  After the usual master_stats
+    line, _log_master_stats writes one more per strain through
+    Logger.master_stats(..., Strain=s), counting only that strain.  A strain's
+    TotalVacc is everybody immune to it: the vaccinated plus its survivors.
+
+
+    _____Attributes______
+
+    Everything a Simulation has, plus:
+
+    strains: [Strain].
+
+    cross_immunity: 2-D list of floats or None.  See MultiStrainPopulation.
+
+    newly_strains: int8 array.  The strain each of newly_infected caught.
+
+    strain_total_infected, strain_current_infected, strain_died, strain_survived,
+        strain_saved: int64 arrays.  The counters of Simulation, kept per strain.
+        A strain's saved counts the interactions where a vaccination stopped that
+        strain.
+
+    _____Methods_____
+
+    __init__(self, population_size, vacc_percentage, strains, cross_immunity=None,
+     logger=None, seed=None, verbosity=None, network=None, metrics=None):
+        - strains is a list of Strain.
+
+    run(self):
+        - Same as Simulation.run, without checkpoints.
+    '''
+
+    def __init__(self, population_size, vacc_percentage, strains, cross_immunity=None,
+                 logger=None, seed=None, verbosity=None, network=None, metrics=None):
+        self.strains = list(strains)
+        self.cross_immunity = cross_immunity
+        count = len(self.strains)
+        self.strain_total_infected = np.zeros(count, dtype=np.int64)
+        self.strain_current_infected = np.zeros(count, dtype=np.int64)
+        self.strain_died = np.zeros(count, dtype=np.int64)
+        self.strain_survived = np.zeros(count, dtype=np.int64)
+        self.strain_saved = np.zeros(count, dtype=np.int64)
+        self.newly_strains = np.zeros(0, dtype=np.int8)
+        Simulation.__init__(self, population_size, vacc_percentage,
+                            "/".join(strain.name for strain in self.strains),
+                            "/".join(str(strain.mortality_rate) for strain in self.strains),
+                            "/".join(str(strain.basic_repro_num) for strain in self.strains),
+                            sum(strain.initial_infected for strain in self.strains),
+                            engine="multi-strain", logger=logger, seed=seed, verbosity=verbosity,
+                            network=network, metrics=metrics)
+
+    def _create_population(self):
+        rngs = dict((name, np.random.default_rng(stream.getrandbits(64)))
+                    for name, stream in self.random_streams.items())
+        population = MultiStrainPopulation(self.population_size, self.vacc_percentage, self.strains,
+                                           rngs["interaction"], rngs["survival"], rngs["population"],
+                                           self.cross_immunity)
+        infected_count = min(self.initial_infected, self.population_size)
+        self.infected_people = np.arange(infected_count)
+        self.current_infected += infected_count
+        self.total_infected += infected_count
+        initial = np.bincount(population.strain[:infected_count], minlength=len(self.strains))
+        self.strain_current_infected += initial
+        self.strain_total_infected += initial
+        self.vaccinated += int(population.is_vaccinated.sum())
+        return population
+
+    def run(self, checkpoint_file=None, checkpoint_every=1):
+        if checkpoint_file:
+            raise ValueError("a multi-strain simulation cannot be checkpointed")
+        return Simulation.run(self)
+
+    def _log_master_stats(self):
+        Simulation._log_master_stats(self)
+        living = self.population_size - self.died
+        newly = np.bincount(self.newly_strains, minlength=len(self.strains))
+        vaccinated = self.vaccinated - self.survived
+        for strain in range(len(self.strains)):
+            self.logger.master_stats(int(self.strain_died[strain]), int(self.strain_survived[strain]),
+                                     vaccinated + int(self.strain_survived[strain]),
+                                     int(self.strain_total_infected[strain]), int(newly[strain]),
+                                     living, int(self.strain_saved[strain]), Strain=strain)
+
+    def time_step(self):
+        """Simulates the interactions of every strain's infected people in one
+        batch.  A newly infected person catches the strain of whoever infected
+        them."""
+        if self.network is not None:
+            infectors, targets, outcomes = self.population.interact_network(
+                self.infected_people, self.network, None)
+        else:
+            infectors, targets, outcomes = self.population.interact(self.infected_people, None)
+        infects = outcomes == INFECTS
+        self.newly_infected = targets[infects]
+        self.newly_strains = self.population.strain[infectors[infects]]
+        saved = np.bincount(self.population.strain[infectors[outcomes == VACCINATED]],
+                            minlength=len(self.strains))
+        self.strain_saved += saved
+        self.saved += int(saved.sum())
+        self.interactions += len(targets)
+        if self.verbosity >= LOG_INTERACTIONS:
+            self.logger.log_interactions(infectors.tolist(), targets.tolist(), outcomes.tolist())
+
+    def _resolve_infections(self):
+        infectors = self.infected_people
+        strains = self.population.strain[infectors]
+        survived = self.population.resolve_infections(infectors)
+        survivors = np.bincount(strains[survived], minlength=len(self.strains))
+        died = np.bincount(strains[~survived], minlength=len(self.strains))
+        self.strain_survived += survivors
+        self.strain_died += died
+        self.strain_current_infected -= survivors + died
+        self.survived += int(survivors.sum())
+        self.vaccinated += int(survivors.sum())
+        self.died += int(died.sum())
+        self.current_infected -= len(infectors)
+        if self.verbosity >= LOG_RESOLUTIONS:
+            self.logger.log_infection_survivals(infectors.tolist(), survived.tolist())
+
+    def _infect_newly_infected(self):
+        order = np.argsort(self.newly_infected, kind="stable")
+        self.infected_people = self.newly_infected[order]
+        self.population.infect(self.infected_people, self.newly_strains[order])
+        newly = np.bincount(self.newly_strains, minlength=len(self.strains))
+        self.strain_current_infected += newly
+        self.strain_total_infected += newly
+        self.current_infected += len(self.newly_infected)
+        self.total_infected += len(self.newly_infected)
+        self.newly_infected = []
+        self.newly_strains = self.newly_strains[:0]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulates several strains of a virus spreading "
+                                                 "through one population.")
+    parser.add_argument("pop_size", type=int)
+    parser.add_argument("vacc_percentage", type=float)
+    parser.add_argument("--strain", nargs=4, action="append", required=True,
+                        metavar=("NAME", "MORTALITY_RATE", "BASIC_REPRO_NUM", "INITIAL_INFECTED"),
+                        help="a strain to simulate, repeat for every strain")
+    parser.add_argument("--cross-immunity", type=float, nargs="+", default=None, metavar="X",
+                        help="how much surviving each strain protects against each strain, "
+                             "row by row (strains squared values, default: only against itself)")
+    parser.add_argument("--log-format", choices=["text", "binary"], default="text")
+    parser.add_argument("--verbosity", choices=sorted(VERBOSITY_LEVELS, key=VERBOSITY_LEVELS.get),
+                        default="steps")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    strains = [Strain(name, float(mortality_rate), float(basic_repro_num), int(initial_infected))
+               for name, mortality_rate, basic_repro_num, initial_infected in args.strain]
+    cross_immunity = None
+    if args.cross_immunity is not None:
+        if len(args.cross_immunity) != len(strains) ** 2:
+            parser.error("--cross-immunity needs {} values".format(len(strains) ** 2))
+        cross_immunity = np.reshape(args.cross_immunity, (len(strains), len(strains)))
+    if args.log_format == "binary":
+        logger = BinaryLogger("log1.bin", verbosity=VERBOSITY_LEVELS[args.verbosity])
+    else:
+        logger = Logger("log1", verbosity=VERBOSITY_LEVELS[args.verbosity])
+    MultiStrainSimulation(args.pop_size, args.vacc_percentage, strains, cross_immunity,
+                          logger=logger, seed=args.seed).run()
@@ -0,0 +1,109 @@
+import argparse, csv, itertools, os, random
+from multiprocessing import Pool
+from logger import Logger, NullLogger, LOG_SUMMARY
+from results import ResultsStore, OUTCOME_COLUMNS
+import simulation
+
+COLUMNS = ["vacc_percentage", "basic_repro_num", "mortality_rate", "replicate", "seed",
+           "infected_percent", "dead_percent", "saved", "time_steps"]
+
+
+def run_seed(base_seed, vacc_percentage, basic_repro_num, mortality_rate, replicate):
+    """Returns the seed for one run.  It only depends on the run's own parameters,
+    so the same run gets the same seed however the grid is ordered or split up
+    between processes."""
+    key = "{}:{}:{}:{}:{}".format(base_seed, vacc_percentage, basic_repro_num, mortality_rate, replicate)
+    return random.Random(key).getrandbits(63)
+
+
+def run_one(job):
+    """Runs a single simulation of the sweep and returns its row of the summary
+    table.  Meant to be called in a worker process."""
+    (pop_size, virus_name, initial_infected, engine, log_dir,
+     vacc_percentage, basic_repro_num, mortality_rate, replicate, seed) = job
+    if log_dir is None:
+        logger = NullLogger(None, verbosity=LOG_SUMMARY)
+    else:
+        logger = Logger(os.path.join(log_dir, "{}_vp_{}_r_{}_m_{}_rep_{}.txt".format(
+            virus_name, vacc_percentage, basic_repro_num, mortality_rate, replicate)), 10000)
+    sim = simulation.Simulation(pop_size, vacc_percentage, virus_name, mortality_rate,
+                                basic_repro_num, initial_infected, engine=engine, logger=logger,
+                                seed=seed)
+    sim.run()
+    return {"population_size": pop_size,
+            "virus_name": virus_name,
+            "initial_infected": initial_infected,
+            "engine": engine,
+            "vacc_percentage": vacc_percentage,
+            "basic_repro_num": basic_repro_num,
+            "mortality_rate": mortality_rate,
+            "replicate": replicate,
+            "seed": seed,
+            "infected_percent": 100.0 * sim.total_infected / pop_size,
+            "dead_percent": 100.0 * sim.died / pop_size,
+            "saved": sim.saved,
+            "time_steps": sim.time_steps,
+            "outcome": dict((name, getattr(sim, name)) for name, _ in OUTCOME_COLUMNS),
+            "step_counts": sim.step_counts}
+
+
+def sweep(pop_size, virus_name, vacc_percentages, basic_repro_nums, mortality_rates,
+          replicates=1, initial_infected=1, engine="list", processes=None, seed=42, log_dir=None,
+          results_file=None):
+    """Runs every combination of the parameter lists `replicates` times, spread
+    over a pool of worker processes, and returns the summary rows in grid order.
+    Logs are only written when log_dir is given.  With results_file, every run
+    is also added to that results.ResultsStore, from this process only."""
+    jobs = []
+    for vacc_percentage, basic_repro_num, mortality_rate in itertools.product(
+            vacc_percentages, basic_repro_nums, mortality_rates):
+        for replicate in range(replicates):
+            jobs.append((pop_size, virus_name, initial_infected, engine, log_dir,
+                         vacc_percentage, basic_repro_num, mortality_rate, replicate,
+                         run_seed(seed, vacc_percentage, basic_repro_num, mortality_rate, replicate)))
+    if log_dir is not None and not os.path.isdir(log_dir):
+        os.makedirs(log_dir)
+    pool = Pool(processes)
+    try:
+        rows = pool.map(run_one, jobs, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+    if results_file is not None:
+        with ResultsStore(results_file) as store:
+            store.add_results(rows)
+    return rows
+
+
+def write_table(rows, file_name):
+    """Writes the summary rows of a sweep to a csv file."""
+    with open(file_name, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs simulation.py over a grid of parameters in parallel.")
+    parser.add_argument("pop_size", type=int)
+    parser.add_argument("virus_name")
+    parser.add_argument("--vacc", type=float, nargs="+", required=True, metavar="VACC_PERCENTAGE")
+    parser.add_argument("--repro", type=float, nargs="+", required=True, metavar="BASIC_REPRO_NUM")
+    parser.add_argument("--mortality", type=float, nargs="+", required=True, metavar="MORTALITY_RATE")
+    parser.add_argument("--replicates", type=int, default=1)
+    parser.add_argument("--initial-infected", type=int, default=1)
+    parser.add_argument("--engine", choices=["list", "array"], default="list")
+    parser.add_argument("--processes", type=int, default=None, help="defaults to one per core")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--log-dir", default=None, help="write one logfile per run into this folder")
+    parser.add_argument("--out", default="sweep_results.csv")
+    parser.add_argument("--results", default=None, metavar="FILE",
+                        help="also add every run to the results store FILE")
+    args = parser.parse_args()
+    rows = sweep(args.pop_size, args.virus_name, args.vacc, args.repro, args.mortality,
+                 args.replicates, args.initial_infected, args.engine, args.processes,
+                 args.seed, args.log_dir, args.results)
+    write_table(rows, args.out)
+    for row in rows:
+        print("{vacc_percentage}\t{basic_repro_num}\t{mortality_rate}\t{replicate}\t"
+              "{infected_percent:.2f}%\t{dead_percent:.2f}%\t{saved}\t{time_steps}".format(**row))
@@ -0,0 +1,53 @@
+import os, shutil, tempfile, unittest
+from analyze import analyze, analyze_binary
+from logger import Logger, BinaryLogger, LOG_SUMMARY, LOG_STEPS, LOG_RESOLUTIONS, LOG_INTERACTIONS
+from simulation import Simulation
+
+
+class AnalyzeTest(unittest.TestCase):
+    '''
+    Whatever the verbosity of a log, analyze and analyze_binary have to answer
+    with the numbers the simulation itself counted.
+    '''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def check(self, logger_class, analyzer, verbosity):
+        log_file = os.path.join(self.directory, "log")
+        simulation = Simulation(2000, 0.5, "Test", 0.3, 0.1, 5, engine="array",
+                                logger=logger_class(log_file, verbosity=verbosity), seed=2)
+        simulation.run()
+        summary = analyzer(log_file)
+        self.assertEqual(summary["ever_infected"], simulation.total_infected)
+        self.assertEqual(summary["dead"], simulation.died)
+        self.assertEqual(summary["saved_by_vaccination"], simulation.saved)
+        return simulation, summary
+
+    def test_text(self):
+        for verbosity in (LOG_SUMMARY, LOG_STEPS, LOG_RESOLUTIONS, LOG_INTERACTIONS):
+            self.check(Logger, analyze, verbosity)
+
+    def test_binary(self):
+        for verbosity in (LOG_SUMMARY, LOG_STEPS, LOG_RESOLUTIONS, LOG_INTERACTIONS):
+            self.check(BinaryLogger, analyze_binary, verbosity)
+
+    def test_steps(self):
+        # No interaction or resolution records, but every time step line and master_stats.
+        for logger_class, analyzer in ((Logger, analyze), (BinaryLogger, analyze_binary)):
+            simulation, summary = self.check(logger_class, analyzer, LOG_STEPS)
+            self.assertEqual(summary["time_steps"], simulation.time_steps)
+            self.assertEqual(summary["inputs"]["initial_infected"], 5)
+
+    def test_too_terse(self):
+        log_file = os.path.join(self.directory, "log")
+        with open(log_file, "w") as f:
+            f.write("2000 0.5 Test 0.3 0.1\n")
+        self.assertRaises(ValueError, analyze, log_file)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import os, shutil, tempfile, unittest
+import checkpoint
+from logger import Logger, LOG_RESOLUTIONS, LOG_INTERACTIONS
+from simulation import Simulation
+
+
+class ResumeTest(unittest.TestCase):
+    '''
+    A run resumed from a checkpoint has to write exactly the log an uninterrupted
+    run with the same seed writes.
+    '''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def simulation(self, log_file, engine, aggregate):
+        return Simulation(20000, 0.5, "Test", 0.3, 0.1, 5, engine=engine,
+                          logger=Logger(log_file, verbosity=LOG_RESOLUTIONS), seed=1,
+                          aggregate=aggregate)
+
+    def check_resume(self, engine, aggregate, stop_after=4, verbosity=LOG_RESOLUTIONS):
+        self.simulation(self.path("full"), engine, aggregate).run()
+        interrupted = self.simulation(self.path("resumed"), engine, aggregate)
+        for summary in interrupted.steps(self.path("checkpoint"), 2):
+            if summary["step"] == stop_after - 1:
+                break
+        resumed = checkpoint.load(self.path("checkpoint"),
+                                  Logger(self.path("resumed"), verbosity=verbosity))
+        self.assertEqual(resumed.time_steps, stop_after)
+        resumed.run()
+        with open(self.path("full")) as full, open(self.path("resumed")) as log:
+            self.assertEqual(full.read(), log.read())
+
+    def test_list(self):
+        self.check_resume("list", False)
+
+    def test_list_aggregate(self):
+        self.check_resume("list", True)
+
+    def test_array(self):
+        self.check_resume("array", False)
+
+    def test_array_aggregate(self):
+        self.check_resume("array", True)
+
+    def test_verbosity(self):
+        # The resumed run logs as much as the original did, whatever its logger says.
+        self.check_resume("array", False, verbosity=LOG_INTERACTIONS)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import os, shutil, tempfile, unittest
+from analyze import analyze, analyze_binary
+from logger import Logger, AsyncLogger, BinaryLogger, LOG_SUMMARY, LOG_STEPS, LOG_RESOLUTIONS, LOG_INTERACTIONS
+from logger import binary_to_text
+from simulation import Simulation
+
+VERBOSITIES = (LOG_SUMMARY, LOG_STEPS, LOG_RESOLUTIONS, LOG_INTERACTIONS)
+
+
+class AsyncLoggerTest(unittest.TestCase):
+    '''
+    An AsyncLogger has to write exactly what the logger it wraps writes on its own.
+    '''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def log(self, name, logger):
+        Simulation(2000, 0.5, "Test", 0.3, 0.1, 5, engine="array", logger=logger, seed=2).run()
+        with open(os.path.join(self.directory, name), "rb") as f:
+            return f.read()
+
+    def check(self, logger_class):
+        for verbosity in VERBOSITIES:
+            direct = self.log("direct", logger_class(os.path.join(self.directory, "direct"),
+                                                     verbosity=verbosity))
+            wrapped = self.log("wrapped", AsyncLogger(logger_class(os.path.join(self.directory, "wrapped"),
+                                                                   verbosity=verbosity)))
+            self.assertEqual(direct, wrapped)
+
+    def test_text(self):
+        self.check(Logger)
+
+    def test_binary(self):
+        self.check(BinaryLogger)
+
+
+class BinaryLoggerTest(unittest.TestCase):
+    '''
+    Counts of a long run have to survive the uint32 fields of the binary log.
+    '''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_large_saved(self):
+        binary_file = os.path.join(self.directory, "log.bin")
+        text_file = os.path.join(self.directory, "log")
+        saved = 5 * 2 ** 32 + 7
+        with BinaryLogger(binary_file, verbosity=LOG_SUMMARY) as logger:
+            logger.write_metadata(3000000000, 0.5, "Test", 0.3, 0.1)
+            logger.master_stats(1000, 2000, 1500000000, 3000, 0, 2999999000, Saved=saved)
+        binary_to_text(binary_file, text_file)
+        self.assertEqual(analyze(text_file)["saved_by_vaccination"], saved)
+        self.assertEqual(analyze_binary(binary_file)["saved_by_vaccination"], saved)
+
+    def test_population_too_big(self):
+        with BinaryLogger(os.path.join(self.directory, "log.bin")) as logger:
+            logger.write_metadata(2 ** 33, 0.5, "Test", 0.3, 0.1)
+            self.assertRaises(ValueError, logger.master_stats, 0, 0, 0, 0, 0, 2 ** 33, Saved=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,179 @@
+import argparse, math, os
+from multiprocessing import Pool
+from results import ResultsStore
+from sweep import run_one, run_seed
+
+# The normal quantile of the 95% confidence intervals a probe stops on.
+Z_95 = 1.959964
+
+
+def wilson_interval(successes, trials, z=Z_95):
+    """Returns the (low, high) Wilson score interval of a proportion.  Unlike the
+    usual normal interval it stays inside [0, 1] and is usable from a handful of
+    trials, including when every trial succeeded or none did."""
+    if trials == 0:
+        return 0.0, 1.0
+    p = successes / float(trials)
+    denominator = 1.0 + z * z / trials
+    centre = (p + z * z / (2.0 * trials)) / denominator
+    spread = z * math.sqrt(p * (1.0 - p) / trials + z * z / (4.0 * trials * trials)) / denominator
+    return max(0.0, centre - spread), min(1.0, centre + spread)
+
+
+class ThresholdSearch(object):
+    '''
+    Finds the herd immunity threshold of a virus: the lowest vacc_percentage at
+    which an outbreak stops spreading, i.e. at which at most `level` of runs
+    infect outbreak_percent of the population or more.
+
+    The search bisects vacc_percentage between low and high.  Every probe runs
+    replicates in parallel, a batch of `batch` at a time, and stops as soon as
+    the 95% Wilson interval of its outbreak rate is entirely above or below
+    level.  Probes far from the threshold settle after the first batch, only the
+    ones close to it need up to max_replicates runs.  Runs use the seeds of
+    sweep.run_seed, so a search is reproducible and its runs are the same runs a
+    sweep over the probed values would make.
+
+
+    _____Attributes______
+
+    pop_size, virus_name, mortality_rate, basic_repro_num, initial_infected, engine:
+        The simulation parameters, as in sweep.run_one.
+
+    low, high: Floats.  The vacc_percentages the threshold is known to lie
+        between.  They narrow as the search goes.
+
+    tolerance: Float.  The search stops when high - low is at most this.
+
+    level: Float.  The outbreak rate considered no longer spreading.
+
+    outbreak_percent: Float.  A run is an outbreak when this percentage of the
+        population or more got infected.
+
+    min_replicates, max_replicates, batch: Ints.  Bounds on the runs of one probe,
+        and how many run at once.
+
+    seed: Int.  Base seed of every run's seed.
+
+    probes: [Dict].  One per probe, in order, holding vacc_percentage, runs,
+        outbreaks, the interval (rate_low, rate_high) and spreads, which is True
+        when the outbreak rate was judged to be above level.
+
+    rows: [Dict].  The sweep.run_one row of every run.
+
+    _____Methods_____
+
+    run(self, processes=None):
+        - Runs the search on a pool of `processes` worker processes, one per core
+            by default.  Returns (low, high).
+
+    probe(self, pool, vacc_percentage):
+        - Runs one probe and returns its entry of probes.
+
+    save(self, results_file):
+        - Adds every run of the search to a results.ResultsStore.
+    '''
+
+    def __init__(self, pop_size, virus_name, mortality_rate, basic_repro_num, initial_infected=1,
+                 engine="array", low=0.0, high=1.0, tolerance=0.01, level=0.5,
+                 outbreak_percent=5.0, min_replicates=4, max_replicates=40, batch=None, seed=42):
+        self.pop_size = pop_size
+        self.virus_name = virus_name
+        self.mortality_rate = mortality_rate
+        self.basic_repro_num = basic_repro_num
+        self.initial_infected = initial_infected
+        self.engine = engine
+        self.low = low
+        self.high = high
+        self.tolerance = tolerance
+        self.level = level
+        self.outbreak_percent = outbreak_percent
+        self.min_replicates = min_replicates
+        self.max_replicates = max_replicates
+        self.batch = batch
+        self.seed = seed
+        self.probes = []
+        self.rows = []
+
+    def run(self, processes=None):
+        pool = Pool(processes)
+        try:
+            if self.batch is None:
+                self.batch = max(self.min_replicates, processes or os.cpu_count() or 1)
+            while self.high - self.low > self.tolerance:
+                # Rounded so probed values stay readable in logs and results.
+                vacc_percentage = round((self.low + self.high) / 2.0, 6)
+                if self.probe(pool, vacc_percentage)["spreads"]:
+                    self.low = vacc_percentage
+                else:
+                    self.high = vacc_percentage
+        finally:
+            pool.close()
+            pool.join()
+        return self.low, self.high
+
+    def probe(self, pool, vacc_percentage):
+        outbreaks = 0
+        runs = 0
+        rate_low, rate_high = 0.0, 1.0
+        while runs < self.max_replicates:
+            count = min(self.batch, self.max_replicates - runs)
+            jobs = [(self.pop_size, self.virus_name, self.initial_infected, self.engine, None,
+                     vacc_percentage, self.basic_repro_num, self.mortality_rate, replicate,
+                     run_seed(self.seed, vacc_percentage, self.basic_repro_num, self.mortality_rate,
+                              replicate))
+                    for replicate in range(runs, runs + count)]
+            rows = pool.map(run_one, jobs, chunksize=1)
+            self.rows.extend(rows)
+            runs += count
+            outbreaks += sum(1 for row in rows if row["infected_percent"] >= self.outbreak_percent)
+            rate_low, rate_high = wilson_interval(outbreaks, runs)
+            if runs >= self.min_replicates and (rate_low > self.level or rate_high < self.level):
+                break
+        result = {"vacc_percentage": vacc_percentage, "runs": runs, "outbreaks": outbreaks,
+                  "rate_low": rate_low, "rate_high": rate_high,
+                  "spreads": outbreaks > self.level * runs}
+        self.probes.append(result)
+        return result
+
+    def save(self, results_file):
+        """Adds every run of the search to a results.ResultsStore."""
+        with ResultsStore(results_file) as store:
+            store.add_results(self.rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Searches for the lowest vaccination percentage "
+                                                 "at which a virus stops spreading.")
+    parser.add_argument("pop_size", type=int)
+    parser.add_argument("virus_name")
+    parser.add_argument("mortality_rate", type=float)
+    parser.add_argument("basic_repro_num", type=float)
+    parser.add_argument("initial_infected", type=int, nargs="?", default=1)
+    parser.add_argument("--engine", choices=["list", "array"], default="array")
+    parser.add_argument("--low", type=float, default=0.0, help="lowest vacc_percentage to consider")
+    parser.add_argument("--high", type=float, default=1.0, help="highest vacc_percentage to consider")
+    parser.add_argument("--tolerance", type=float, default=0.01,
+                        help="stop once the threshold is known to within this")
+    parser.add_argument("--level", type=float, default=0.5,
+                        help="outbreak rate at which a vaccination level counts as stopping the virus")
+    parser.add_argument("--outbreak-percent", type=float, default=5.0,
+                        help="percentage of the population infected that makes a run an outbreak")
+    parser.add_argument("--min-replicates", type=int, default=4)
+    parser.add_argument("--max-replicates", type=int, default=40)
+    parser.add_argument("--processes", type=int, default=None, help="defaults to one per core")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--results", default=None, metavar="FILE",
+                        help="add every run of the search to the results store FILE")
+    args = parser.parse_args()
+    search = ThresholdSearch(args.pop_size, args.virus_name, args.mortality_rate, args.basic_repro_num,
+                             args.initial_infected, args.engine, args.low, args.high, args.tolerance,
+                             args.level, args.outbreak_percent, args.min_replicates,
+                             args.max_replicates, seed=args.seed)
+    low, high = search.run(args.processes)
+    for probe in search.probes:
+        print("{vacc_percentage}\t{outbreaks}/{runs}\t[{rate_low:.2f}, {rate_high:.2f}]\t"
+              "{}".format("spreads" if probe["spreads"] else "stopped", **probe))
+    print("Herd immunity threshold between {} and {}, found in {} runs.".format(low, high, len(search.rows)))
+    if args.results:
+        search.save(args.results)